@@ -0,0 +1,131 @@
+"""
+Inspect and replay list events parked in the dead-letter queue (list_updates_dead).
+
+  python -m bin.dlq inspect --limit 20
+      Show parked events with their retry count, error and original shard. Nothing is removed.
+
+  python -m bin.dlq replay --limit 100 [--list-id 42]
+      Republish parked events to their original shard with the retry count reset, then
+      remove them from the queue. With --list-id, events of other lists stay parked.
+
+  python -m bin.dlq purge --yes
+      Drop every parked event.
+
+Replay once the cause is fixed; an event that still fails comes back after its retries.
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timezone
+
+import aio_pika
+
+from src.todolist.config import RABBIT_URL
+from src.todolist.services.events.schema import decode_event
+from src.todolist.services.rabbitmq.retry import (
+    DEAD_QUEUE,
+    ERROR_HEADER,
+    FAILED_AT_HEADER,
+    RETRY_COUNT_HEADER,
+    RETRY_DELAY_HEADER,
+    ROUTING_KEY_HEADER,
+    declare_retry_topology
+)
+from src.todolist.services.rabbitmq.shards import EXCHANGE_NAME
+
+PREVIEW_CHARS = 200
+PARKED_HEADERS = (ERROR_HEADER, FAILED_AT_HEADER, RETRY_COUNT_HEADER, RETRY_DELAY_HEADER, ROUTING_KEY_HEADER)
+
+
+def list_id_of(message: aio_pika.abc.AbstractIncomingMessage):
+    try:
+        return decode_event(message.body, message.content_type).get("list_id")
+    except Exception:
+        return None
+
+
+def describe(index: int, message: aio_pika.abc.AbstractIncomingMessage) -> str:
+    headers = message.headers or {}
+    failed_at = headers.get(FAILED_AT_HEADER)
+    when = datetime.fromtimestamp(int(failed_at), timezone.utc).isoformat() if failed_at else "?"
+    try:
+        body = repr(decode_event(message.body, message.content_type))
+    except Exception:
+        body = message.body.decode(errors="replace")
+    if len(body) > PREVIEW_CHARS:
+        body = body[:PREVIEW_CHARS] + "..."
+    return (
+        f"#{index} failed {when}, {headers.get(RETRY_COUNT_HEADER, 0)} retries, "
+        f"shard {headers.get(ROUTING_KEY_HEADER, '?')!s}\n"
+        f"    error: {headers.get(ERROR_HEADER, '?')!s}\n"
+        f"    body:  {body}"
+    )
+
+
+async def fetch(queue: aio_pika.abc.AbstractQueue, limit: int):
+    """Take up to `limit` events without acking them; whatever is not acked is requeued when the channel closes."""
+    messages = []
+    while len(messages) < limit:
+        message = await queue.get(no_ack=False, fail=False)
+        if message is None:
+            break
+        messages.append(message)
+    return messages
+
+
+async def run(args) -> int:
+    connection = await aio_pika.connect_robust(RABBIT_URL)
+    try:
+        channel = await connection.channel(publisher_confirms=True)
+        await declare_retry_topology(channel)
+        queue = await channel.get_queue(DEAD_QUEUE)
+
+        if args.command == "purge":
+            if not args.yes:
+                print("Refusing to purge without --yes", file=sys.stderr)
+                return 1
+            result = await queue.purge()
+            print(f"Purged {result.message_count} events from {DEAD_QUEUE}")
+            return 0
+
+        messages = await fetch(queue, args.limit)
+        if args.command == "inspect":
+            for index, message in enumerate(messages, 1):
+                print(describe(index, message))
+            print(f"{len(messages)} events shown from {DEAD_QUEUE}")
+            return 0
+
+        exchange = await channel.get_exchange(EXCHANGE_NAME)
+        replayed = 0
+        for message in messages:
+            if args.list_id is not None and list_id_of(message) != args.list_id:
+                continue
+            headers = {k: v for k, v in (message.headers or {}).items() if k not in PARKED_HEADERS}
+            await exchange.publish(
+                aio_pika.Message(
+                    body=message.body,
+                    content_type=message.content_type,
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                    headers=headers,
+                ),
+                routing_key=str((message.headers or {}).get(ROUTING_KEY_HEADER) or message.routing_key),
+            )
+            await message.ack()
+            replayed += 1
+        print(f"Replayed {replayed} of {len(messages)} events fetched from {DEAD_QUEUE}")
+        return 0
+    finally:
+        await connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["inspect", "replay", "purge"])
+    parser.add_argument("--limit", type=int, default=20, help="events to fetch (inspect, replay)")
+    parser.add_argument("--list-id", type=int, default=None, help="replay only this list's events")
+    parser.add_argument("--yes", action="store_true", help="confirm purge")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+End-to-end real-time latency harness: write -> RabbitMQ -> consumer -> Redis -> WebSocketManager -> socket.
+
+Two targets:
+
+  python -m bin.loadtest stack --base-url http://localhost:8000 --clients 200 --lists 20 --rate 50 --duration 30
+      Drives writes through the REST API of a running stack (docker-compose) and
+      listens on real WebSockets. Latency runs from sending the add-task request to
+      the task_added frame arriving. The target should run with RATE_LIMIT_ENABLED=false
+      and WS_MAX_CONNECTIONS_PER_USER >= --clients, since every client is the same user.
+
+  python -m bin.loadtest inprocess --clients 2000 --lists 100 --rate 500 --duration 10
+      Runs the real consumer and WebSocketManager in this process, with fakeredis
+      for Redis and an asyncio queue for RabbitMQ (pip install fakeredis). Measures
+      the fan-out path without HTTP, the database or the network.
+
+Both print p50/p99/p999 propagation latency and throughput; --json emits the same as
+JSON and --max-p99-ms makes the run exit non-zero above a threshold, for CI.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import math
+import signal
+import sys
+import time
+import uuid
+
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+
+@dataclass
+class Stats:
+    sent: Dict[str, float] = field(default_factory=dict)  # marker -> send time
+    latencies: List[float] = field(default_factory=list)  # seconds, one per delivery
+    write_errors: int = 0
+    started: float = 0.0
+    writes_done: float = 0.0
+
+    def delivered(self, marker: str, now: float):
+        sent_at = self.sent.get(marker)
+        if sent_at is not None:
+            self.latencies.append(now - sent_at)
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def markers_in(frame: dict):
+    """Markers of task_added events in a frame, unwrapping coalesced batches."""
+    events = frame.get("events") if frame.get("action") == "batch" else [frame]
+    for event in events or []:
+        if event.get("action") == "task_added":
+            task = event.get("task") or {}
+            title = task.get("task_title") or ""
+            if title.startswith("lt-"):
+                yield title
+
+
+def report(stats: Stats, args) -> dict:
+    elapsed = max(stats.writes_done - stats.started, 1e-9)
+    expected = len(stats.sent) * (args.clients / args.lists)
+    result = {
+        "target": args.target,
+        "clients": args.clients,
+        "lists": args.lists,
+        "writes": len(stats.sent),
+        "write_errors": stats.write_errors,
+        "writes_per_sec": round(len(stats.sent) / elapsed, 1),
+        "deliveries": len(stats.latencies),
+        "deliveries_per_sec": round(len(stats.latencies) / elapsed, 1),
+        "delivery_ratio": round(len(stats.latencies) / expected, 4) if expected else 0,
+        "p50_ms": round(percentile(stats.latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(stats.latencies, 99) * 1000, 2),
+        "p999_ms": round(percentile(stats.latencies, 99.9) * 1000, 2),
+        "max_ms": round(max(stats.latencies, default=float("nan")) * 1000, 2),
+    }
+    if args.json:
+        print(json.dumps(result))
+    else:
+        for key, value in result.items():
+            print(f"{key:>20}: {value}")
+    return result
+
+
+async def drive_writes(args, stats: Stats, write):
+    """Issue `--rate` writes per second for `--duration` seconds, round-robin over lists."""
+    run_id = uuid.uuid4().hex[:8]
+    interval = 1 / args.rate
+    limit = asyncio.Semaphore(args.concurrency)
+    pending = set()
+
+    async def one(list_index: int, marker: str):
+        async with limit:
+            stats.sent[marker] = time.perf_counter()
+            try:
+                await write(list_index, marker)
+            except Exception as e:
+                stats.sent.pop(marker, None)
+                stats.write_errors += 1
+                if stats.write_errors <= 5:
+                    print(f"write failed: {e}", file=sys.stderr)
+
+    stats.started = time.perf_counter()
+    deadline = stats.started + args.duration
+    for seq in itertools.count():
+        due = stats.started + seq * interval
+        if due >= deadline:
+            break
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.create_task(one(seq % args.lists, f"lt-{run_id}-{seq}"))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+    await asyncio.gather(*pending)
+    stats.writes_done = time.perf_counter()
+    # let in-flight events land
+    await asyncio.sleep(args.settle)
+
+
+async def run_stack(args, stats: Stats):
+    import httpx
+    from websockets.asyncio.client import connect
+
+    api = f"{args.base_url.rstrip('/')}/api/v1"
+    ws_base = args.base_url.rstrip("/").replace("http", "ws", 1)
+    email = f"loadtest-{uuid.uuid4().hex[:8]}@example.com"
+    password = "LoadTest123!"
+
+    async with httpx.AsyncClient(timeout=30, limits=httpx.Limits(max_connections=args.concurrency)) as http:
+        response = await http.post(f"{api}/auth/register", json={
+            "email": email, "password": password, "first_name": "Load", "last_name": "Test",
+        })
+        response.raise_for_status()
+        response = await http.post(f"{api}/auth/login", json={"email": email, "password": password})
+        response.raise_for_status()
+        token = response.json()["token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        list_ids = []
+        for i in range(args.lists):
+            response = await http.post(f"{api}/tasks/create-list", json={"title": f"loadtest {i}"}, headers=headers)
+            response.raise_for_status()
+            list_ids.append(response.json()["id"])
+
+        async def client(list_id: int, ready: asyncio.Event):
+            async with connect(f"{ws_base}/ws/{list_id}?token={token}", max_queue=None) as ws:
+                ready.set()
+                async for raw in ws:
+                    now = time.perf_counter()
+                    frame = json.loads(raw)
+                    if frame.get("action") == "ping":
+                        await ws.send('{"action":"pong"}')
+                        continue
+                    for marker in markers_in(frame):
+                        stats.delivered(marker, now)
+
+        readies = []
+        clients = []
+        for i in range(args.clients):
+            ready = asyncio.Event()
+            readies.append(ready)
+            clients.append(asyncio.create_task(client(list_ids[i % args.lists], ready)))
+        await asyncio.wait_for(asyncio.gather(*(r.wait() for r in readies)), timeout=60)
+
+        async def write(list_index: int, marker: str):
+            response = await http.post(
+                f"{api}/tasks/{list_ids[list_index]}/add-task",
+                json={"task_title": marker},
+                headers=headers,
+            )
+            response.raise_for_status()
+
+        await drive_writes(args, stats, write)
+        for task in clients:
+            task.cancel()
+        await asyncio.gather(*clients, return_exceptions=True)
+
+
+async def run_inprocess(args, stats: Stats):
+    try:
+        import fakeredis
+    except ImportError:
+        sys.exit("inprocess mode needs fakeredis: pip install fakeredis")
+
+    from src.todolist.websocket.manager import ws_manager
+    from src.todolist.services.events.schema import TASK_ADDED, encode_event, make_event
+    from src.todolist.services.rabbitmq.consumer import decode_message, handle_event
+
+    # the consumer module installs its own shutdown handlers on import, and logs every event
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    ws_manager.pubsub.redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+
+    class RecordingSocket:
+        async def send_text(self, text: str):
+            now = time.perf_counter()
+            for marker in markers_in(json.loads(text)):
+                stats.delivered(marker, now)
+
+        async def send_bytes(self, data: bytes):
+            pass
+
+        async def close(self, code: int = 1000):
+            pass
+
+    connections = []
+    for i in range(args.clients):
+        connection = ws_manager.open(RecordingSocket(), user_id=i)
+        await ws_manager.join(i % args.lists + 1, connection)
+        connections.append(connection)
+
+    broker: asyncio.Queue = asyncio.Queue()
+
+    async def consume():
+        while True:
+            msg = decode_message(*await broker.get())
+            if msg is not None:
+                # like the real consumer, don't wait for the Redis pipeline before the next event
+                await handle_event(msg)
+
+    consumer = asyncio.create_task(consume())
+
+    async def write(list_index: int, marker: str):
+        list_id = list_index + 1
+        event = make_event(TASK_ADDED, {"id": marker, "list_id": list_id, "task_title": marker})
+        event["list_id"] = list_id
+        await broker.put(encode_event(event))
+
+    await drive_writes(args, stats, write)
+    consumer.cancel()
+    for connection in connections:
+        await ws_manager.disconnect_user(connection)
+    await ws_manager.pubsub.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("target", choices=["stack", "inprocess"])
+    parser.add_argument("--base-url", default="http://localhost:8000", help="stack target only")
+    parser.add_argument("--clients", type=int, default=100, help="simulated WebSocket clients")
+    parser.add_argument("--lists", type=int, default=10, help="lists the clients are spread over")
+    parser.add_argument("--rate", type=float, default=20, help="writes per second, across all lists")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of writes")
+    parser.add_argument("--concurrency", type=int, default=50, help="writes in flight at once")
+    parser.add_argument("--settle", type=float, default=2, help="seconds to wait for stragglers after the last write")
+    parser.add_argument("--json", action="store_true", help="print the report as one JSON object")
+    parser.add_argument("--max-p99-ms", type=float, default=None, help="exit 1 if p99 latency exceeds this")
+    args = parser.parse_args()
+
+    stats = Stats()
+    runner = run_stack if args.target == "stack" else run_inprocess
+    asyncio.run(runner(args, stats))
+    result = report(stats, args)
+
+    if args.max_p99_ms is not None and not result["p99_ms"] <= args.max_p99_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
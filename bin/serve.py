@@ -0,0 +1,30 @@
+import uvicorn
+
+from src.todolist.config import WS_DEFLATE_ENABLED
+from src.todolist.websocket.deflate import websocket_protocol
+from src.todolist.websocket.lifecycle import ws_lifecycle
+
+
+class DrainingServer(uvicorn.Server):
+    """
+    uvicorn closes every WebSocket with 1012 as soon as shutdown starts.
+    Stop listening and drain sockets gradually first, so clients reconnect elsewhere over a window.
+    """
+
+    async def shutdown(self, sockets=None):
+        for server in self.servers:
+            server.close()
+        await ws_lifecycle.drain()
+        await super().shutdown(sockets)
+
+
+if __name__ == "__main__":
+    # run as `python -m bin.serve` from the project root
+    config = uvicorn.Config(
+        "src.todolist.main:app",
+        host="0.0.0.0",
+        port=8000,
+        ws=websocket_protocol(),
+        ws_per_message_deflate=WS_DEFLATE_ENABLED,
+    )
+    DrainingServer(config).run()
@@ -9,5 +9,5 @@ alembic upgrade head
 if [ "$#" -gt 0 ]; then
   exec "$@"
 else
-  exec uvicorn src.todolist.main:app --host 0.0.0.0 --port 8000
+  exec python -m bin.serve
 fi
\ No newline at end of file
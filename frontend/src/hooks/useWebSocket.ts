@@ -23,7 +23,7 @@ export const useWebSocket = (listId: number | null) => {
       console.log(' WebSocket message received:', message);
       
       // Use the Ref to call the function
-      if (['task_added', 'task_updated', 'task_deleted', 'user_added', 'user_removed'].includes(message.action)) {
+      if (['task_added', 'task_updated', 'task_deleted', 'list_deleted', 'user_added', 'user_removed', 'resync', 'batch'].includes(message.action)) {
         console.log(' Refreshing tasks due to real-time update...');
         loadTasksRef.current();
       }
@@ -126,6 +126,15 @@ class TaskApiService {
       body: JSON.stringify({ user_id: userId }),
     });
   }
+
+  // Real-time
+  async getWsToken(listId: number): Promise<{ token: string; expires_in: number }> {
+    return this.request(`/tasks/${listId}/ws-token`);
+  }
+
+  async getPresence(listId: number): Promise<{ list_id: number; count: number; user_ids: number[] }> {
+    return this.request(`/tasks/${listId}/presence`);
+  }
 }
 
 export const taskApi = new TaskApiService(API_BASE_URL);
\ No newline at end of file
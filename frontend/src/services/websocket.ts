@@ -1,4 +1,5 @@
 import type { WebSocketMessage } from '../types/task.types';
+import { taskApi } from './taskApi';
 
 class WebSocketManager {
   private ws: WebSocket | null = null;
@@ -6,15 +7,28 @@ class WebSocketManager {
   private reconnectAttempts = 0;
   private maxReconnectAttempts = 5;
   private reconnectDelay = 2000;
+  private lastEventIds: Map<number, string> = new Map();
 
-  connect(listId: number, token: string) {
+  async connect(listId: number, token: string) {
     if (this.ws?.readyState === WebSocket.OPEN) {
       return;
     }
 
     const apiUrl = import.meta.env.VITE_API_URL || 'http://localhost:8000';
     const wsBaseUrl = apiUrl.replace(/^http/, 'ws');
-    const wsUrl = `${wsBaseUrl}/ws/${listId}?token=${token}`;
+
+    // Prefer a per-list capability token: the server authorizes it without a DB lookup
+    let auth = `token=${token}`;
+    try {
+      const capability = await taskApi.getWsToken(listId);
+      auth = `cap=${capability.token}`;
+    } catch (error) {
+      console.warn('Falling back to session token for WebSocket auth:', error);
+    }
+    // Resume from the last event we saw so the server can replay what we missed
+    const lastEventId = this.lastEventIds.get(listId);
+    const resume = lastEventId ? `&last_event_id=${lastEventId}` : '';
+    const wsUrl = `${wsBaseUrl}/ws/${listId}?${auth}${resume}`;
 
     this.ws = new WebSocket(wsUrl);
 
@@ -26,6 +40,20 @@ class WebSocketManager {
     this.ws.onmessage = (event) => {
       try {
         const message: WebSocketMessage = JSON.parse(event.data);
+        if (message.action === 'ping') {
+          // Heartbeat: the server evicts sockets that stop answering
+          this.ws?.send(JSON.stringify({ action: 'pong' }));
+          return;
+        }
+        if (message.action === 'reconnect') {
+          // The server is draining: move to another node at our assigned time, not all at once
+          const socket = this.ws;
+          setTimeout(() => socket?.close(), message.after_ms ?? 0);
+          return;
+        }
+        if (message.event_id) {
+          this.lastEventIds.set(listId, message.event_id);
+        }
         this.notifyListeners(listId.toString(), message);
       } catch (error) {
         console.error('Failed to parse WebSocket message:', error);
@@ -36,8 +64,12 @@ class WebSocketManager {
       console.error('WebSocket error:', error);
     };
 
-    this.ws.onclose = () => {
+    this.ws.onclose = (event) => {
       console.log('WebSocket disconnected');
+      if (event.code === 1008) {
+        // policy violation: access to the list was revoked, reconnecting would be refused
+        return;
+      }
       this.attemptReconnect(listId, token);
     };
   }
@@ -86,7 +86,12 @@ export interface RemoveUserResponse {
 }
 
 export interface WebSocketMessage {
-  action: 'task_added' | 'task_updated' | 'task_deleted' | 'list_title_update' | 'user_added' | 'user_removed';
+  action: 'task_added' | 'task_updated' | 'task_deleted' | 'list_title_update' | 'list_deleted' | 'user_added' | 'user_removed' | 'resync' | 'ping' | 'batch' | 'presence' | 'reconnect';
+  event_id?: string;
+  events?: WebSocketMessage[];
+  joined?: number[];
+  left?: number[];
+  after_ms?: number;
   task?: Task;
   list?: TodoList;
   member?: { user_id: number; role: string };
@@ -5,7 +5,7 @@ from datetime import datetime, timezone, timedelta
 from fastapi import HTTPException, Depends, BackgroundTasks
 from fastapi.security.utils import get_authorization_scheme_param
 
-from jose import jwt, JWTError
+from jose import JWTError
 from jose.exceptions import JWKError
 
 from sqlalchemy.exc import IntegrityError
@@ -14,7 +14,7 @@ from starlette.requests import Request
 from starlette.status import HTTP_401_UNAUTHORIZED
 
 from src.todolist.auth.models import TodolistUser, UserCreate, OtpCode, OtpModel
-from src.todolist.config import TODOLIST_JWT_SECRET, TODOLIST_JWT_ALG
+from src.todolist.auth.token_cache import decode_token
 # from .utils import (
 #     generate_random_string, 
 #     send_mail
@@ -130,12 +130,19 @@ def get_current_user(request: Request)-> TodolistUser:
     token = param
 
     try:
-        data = jwt.decode(token, TODOLIST_JWT_SECRET, algorithms=TODOLIST_JWT_ALG)
+        data = decode_token(token)
     except (JWTError, JWKError):
         raise HTTPException(
             status_code=HTTP_401_UNAUTHORIZED,
             detail=[{"msg": "Could not validate credentials"}],
         ) from None
+
+    if data.get("scope"):
+        # scoped tokens (e.g. WebSocket capabilities) are not session tokens
+        raise HTTPException(
+            status_code=HTTP_401_UNAUTHORIZED,
+            detail=[{"msg": "Could not validate credentials"}],
+        )
     
     user_id = data.get("sub")
 
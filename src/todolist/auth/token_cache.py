@@ -0,0 +1,82 @@
+import hashlib
+import logging
+import threading
+import time
+
+from cachetools import TLRUCache
+from jose import jwt, JWTError
+
+from src.todolist.config import (
+    TODOLIST_JWT_ALG,
+    TODOLIST_JWT_CACHE_SIZE,
+    TODOLIST_JWT_SECRET
+)
+
+from typing import Any, Callable, Dict
+
+log = logging.getLogger(__name__)
+
+RevocationCheck = Callable[[Dict[str, Any]], bool]
+
+
+class VerifiedTokenCache:
+    """
+    Bounded cache of verified JWT claims.
+    - Keyed by a sha256 digest of the token, so raw tokens are never held as keys.
+    - Each entry expires at the token's own `exp`, never later than jwt.decode would allow.
+    - An optional revocation check runs on every lookup, cached or not.
+    """
+
+    def __init__(self, maxsize: int = TODOLIST_JWT_CACHE_SIZE):
+        self._cache = TLRUCache(maxsize=maxsize, ttu=self._ttu, timer=time.time)
+        self._lock = threading.Lock()
+        self._revocation_check: RevocationCheck | None = None
+
+    @staticmethod
+    def _ttu(key: str, claims: Dict[str, Any], now: float) -> float:
+        """Expire at the token `exp`; tokens without one are not kept."""
+        return float(claims.get("exp", now))
+
+    @staticmethod
+    def _digest(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def set_revocation_check(self, check: RevocationCheck | None):
+        """Register a callable that returns True for claims that must be rejected."""
+        self._revocation_check = check
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        """Return verified claims for `token`, raising JWTError if invalid or revoked."""
+        key = self._digest(token)
+
+        with self._lock:
+            claims = self._cache.get(key)
+
+        if claims is None:
+            claims = jwt.decode(token, TODOLIST_JWT_SECRET, algorithms=[TODOLIST_JWT_ALG])
+            with self._lock:
+                self._cache[key] = claims
+
+        if self._revocation_check and self._revocation_check(claims):
+            self.invalidate(token)
+            raise JWTError("Token has been revoked")
+
+        return dict(claims)
+
+    def invalidate(self, token: str):
+        """Drop a single token from the cache."""
+        with self._lock:
+            self._cache.pop(self._digest(token), None)
+
+    def clear(self):
+        """Drop every cached token, e.g. after rotating the signing secret."""
+        with self._lock:
+            self._cache.clear()
+
+
+token_cache = VerifiedTokenCache()
+
+
+def decode_token(token: str) -> Dict[str, Any]:
+    """Verify a JWT through the shared cache."""
+    return token_cache.decode(token)
@@ -3,6 +3,7 @@ from os import path
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, status
 from fastapi.responses import JSONResponse, FileResponse
+from prometheus_client import start_http_server
 from pydantic import ValidationError
 from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
 from starlette.middleware.cors import CORSMiddleware
@@ -16,8 +17,10 @@ from src.todolist.auth.views import auth_router
 from src.todolist.tasks.views import task_router, user_router
 from src.todolist.services.ai_nlp.views import ai_router
 from src.todolist.websocket.views import ws_router
-from src.todolist.services.rabbitmq.producer import rabbit_publisher
-from src.todolist.config import STATIC_DIR
+from src.todolist.websocket.lifecycle import ws_lifecycle
+from src.todolist.services.events.transport import event_transport
+from src.todolist.services.rate_limiter import RateLimitMiddleware
+from src.todolist.config import METRICS_PORT, STATIC_DIR
 
 # -------------------------------
 # Logging
@@ -110,6 +113,10 @@ async def db_session_middleware(request, call_next):
 api.add_middleware(
     ExceptionMiddleware
     )
+# throttle before a DB session is opened for the request
+api.add_middleware(
+    RateLimitMiddleware
+    )
 api.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -131,13 +138,21 @@ def root():
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # --- Startup ---
-    await rabbit_publisher.connect()
+    # metrics go on an internal port, never on the public app
+    if METRICS_PORT:
+        try:
+            start_http_server(METRICS_PORT)
+        except OSError as e:
+            log.error(f"Metrics exporter not started on port {METRICS_PORT}: {e}")
+    await event_transport.connect()
     print("Application startup complete")
 
     yield 
 
     # --- Shutdown ---
-    await rabbit_publisher.close()
+    # no-op if the server already drained sockets before closing them (bin/serve.py)
+    await ws_lifecycle.drain()
+    await event_transport.close()
     print("Application shutdown complete")
 
 # -------------------------------
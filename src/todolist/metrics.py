@@ -0,0 +1,102 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# Prometheus metrics, exported by the main app on METRICS_PORT
+# (consumer and queue metrics by the consumer's and the lag sidecar's own exporters).
+
+# websocket
+WS_CONNECTIONS = Gauge(
+    "todolist_ws_connections",
+    "Live WebSocket connections on this node",
+)
+WS_ROOM_CONNECTIONS = Gauge(
+    "todolist_ws_room_connections",
+    "Live WebSocket connections per list room on this node",
+    ["list_id"],
+)
+WS_EVICTIONS = Counter(
+    "todolist_ws_evictions_total",
+    "WebSocket connections closed by the server",
+    ["reason"],
+)
+WS_REJECTED = Counter(
+    "todolist_ws_rejected_total",
+    "WebSocket connections refused at admission",
+    ["reason"],
+)
+
+# rabbitmq publisher
+RABBIT_PUBLISH_QUEUE_DEPTH = Gauge(
+    "todolist_rabbit_publish_queue_depth",
+    "Events queued in-process and not yet confirmed by RabbitMQ",
+)
+RABBIT_PUBLISHED = Counter(
+    "todolist_rabbit_published_total",
+    "Events handed to the publisher, by outcome",
+    ["result"],
+)
+RABBIT_PUBLISH_BATCH = Histogram(
+    "todolist_rabbit_publish_batch_size",
+    "Events published per batch",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500),
+)
+RABBIT_PUBLISH_LATENCY = Histogram(
+    "todolist_rabbit_publish_latency_seconds",
+    "Time from enqueue to broker confirm",
+)
+RABBIT_SPOOL_BYTES = Gauge(
+    "todolist_rabbit_spool_bytes",
+    "Bytes of events spooled to disk while RabbitMQ is unreachable",
+)
+RABBIT_SPOOL_SEGMENTS = Gauge(
+    "todolist_rabbit_spool_segments",
+    "Segment files in the disk spool",
+)
+RABBIT_SPOOLED = Counter(
+    "todolist_rabbit_spooled_total",
+    "Events through the disk spool, by outcome",
+    ["result"],
+)
+
+# rabbitmq queues (sampled from the broker)
+RABBIT_QUEUE_MESSAGES = Gauge(
+    "todolist_rabbit_queue_messages",
+    "Messages in a queue, by state (unacked needs the management API)",
+    ["queue", "state"],
+)
+RABBIT_QUEUE_CONSUMERS = Gauge(
+    "todolist_rabbit_queue_consumers",
+    "Consumers attached to a queue",
+    ["queue"],
+)
+RABBIT_QUEUE_RATE = Gauge(
+    "todolist_rabbit_queue_rate",
+    "Broker-side message rate of a queue per second (management API only)",
+    ["queue", "kind"],
+)
+RABBIT_QUEUE_DRAIN_SECONDS = Gauge(
+    "todolist_rabbit_queue_drain_seconds",
+    "Ready messages divided by the ack rate: how far consumers are behind (management API only)",
+    ["queue"],
+)
+
+# rabbitmq consumer
+CONSUMER_EVENTS = Counter(
+    "todolist_consumer_events_total",
+    "Events settled by the consumer, by shard and outcome",
+    ["shard", "result"],
+)
+CONSUMER_PROCESSING_LATENCY = Histogram(
+    "todolist_consumer_processing_seconds",
+    "Time from delivery to the consumer until the event reached Redis",
+    ["shard"],
+)
+CONSUMER_EVENT_AGE = Histogram(
+    "todolist_consumer_event_age_seconds",
+    "Time from the API publishing an event until it reached Redis",
+    ["shard"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+CONSUMER_INFLIGHT = Gauge(
+    "todolist_consumer_inflight",
+    "Events delivered to this consumer and not yet acked",
+)
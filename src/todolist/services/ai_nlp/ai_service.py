@@ -21,7 +21,6 @@ log = logging.getLogger(__name__)
 REDIS_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}/0"
 
 CACHE_TTL = 300
-RATE_LIMIT_PER_MIN = 30
 CONCURRENCY_LIMIT = 8
 
 _MAX_WORDS = 8
@@ -88,19 +87,6 @@ async def _set_cache(prefix: str, context: Optional[str], value: str):
     except Exception:
         pass
 
-async def _rate_limit_ok(user_id: Optional[str]) -> bool:
-    if not user_id:
-        return True
-    try:
-        redis = await _get_redis()
-        key = f"ai:rl:{user_id}"
-        count = await redis.incr(key)
-        if count == 1:
-            await redis.expire(key, 60)
-        return count <= RATE_LIMIT_PER_MIN
-    except Exception:
-        return True
-
 # -------------------- Inference Engine (Gemini) --------------------
 def _build_smart_prompt(prefix: str, context: Optional[str]) -> str:
     """
@@ -194,9 +180,7 @@ async def suggest_completion(
     if not prefix or len(prefix) < 2:
         return ""
 
-    # Check Rate Limit
-    if not await _rate_limit_ok(str(user_id) if user_id else None):
-        return ""
+    # Rate limiting is applied per user by RateLimitMiddleware
 
     # Check Cache (Cache key includes context!)
     cached = await _get_cached(prefix, context)
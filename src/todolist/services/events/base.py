@@ -0,0 +1,21 @@
+from typing import Any, Dict
+
+
+class EventTransport:
+    """
+    Carries list events from the API to the WebSocket fan-out.
+    - Call connect() at startup (lifespan) and close() at shutdown.
+    - publish() returns once the event is handed off, not once it is delivered.
+    - Events of one list are delivered in publish order.
+    """
+
+    name = "base"
+
+    async def connect(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def publish(self, list_id: int, event: Dict[str, Any]):
+        raise NotImplementedError
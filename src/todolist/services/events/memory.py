@@ -0,0 +1,31 @@
+from typing import Any, Dict
+
+from src.todolist.services.events.base import EventTransport
+from src.todolist.services.local_bus import LocalPubSubManager
+from src.todolist.websocket.manager import ws_manager
+
+DRAIN_TIMEOUT = 5  # seconds spent delivering queued events on shutdown
+
+
+class InMemoryEventTransport(EventTransport):
+    """
+    API → in-process asyncio bus → WebSockets, for single-node runs and tests.
+    No RabbitMQ, Redis or consumer involved; only sockets on this process see the events.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        if not isinstance(ws_manager.pubsub, LocalPubSubManager):
+            raise RuntimeError("The in-memory transport needs ws_manager on the local bus (EVENT_TRANSPORT=memory)")
+        self.bus: LocalPubSubManager = ws_manager.pubsub
+
+    async def connect(self):
+        await self.bus.connect()
+
+    async def close(self):
+        await self.bus.drain(timeout=DRAIN_TIMEOUT)
+        await self.bus.close()
+
+    async def publish(self, list_id: int, event: Dict[str, Any]):
+        await ws_manager.broadcast_task_event(list_id, event)
@@ -0,0 +1,23 @@
+from typing import Any, Dict
+
+from src.todolist.services.events.base import EventTransport
+from src.todolist.services.rabbitmq.producer import AsyncRabbitPublisher, rabbit_publisher
+
+
+class RabbitEventTransport(EventTransport):
+    """API → RabbitMQ shard queues → consumer workers → Redis → WebSockets."""
+
+    name = "rabbitmq"
+
+    def __init__(self, publisher: AsyncRabbitPublisher = rabbit_publisher):
+        self.publisher = publisher
+
+    async def connect(self):
+        # non-fatal: without a broker, events are spooled to disk until it is back
+        await self.publisher.start()
+
+    async def close(self):
+        await self.publisher.close()
+
+    async def publish(self, list_id: int, event: Dict[str, Any]):
+        await self.publisher.publish_sharded_event(message=event, list_id=list_id)
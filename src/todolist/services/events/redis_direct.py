@@ -0,0 +1,39 @@
+import asyncio
+import logging
+
+from typing import Any, Dict
+
+from src.todolist.services.events.base import EventTransport
+from src.todolist.services.events.schema import is_control_event
+from src.todolist.websocket.manager import ws_manager
+
+logger = logging.getLogger(__name__)
+
+DRAIN_TIMEOUT = 5  # seconds spent flushing queued publishes on shutdown
+
+
+class RedisEventTransport(EventTransport):
+    """
+    API → Redis → WebSockets, for small deployments.
+    - Skips RabbitMQ and the consumer process; the API publishes through ws_manager's
+      pipelined batcher, so concurrent requests share Redis round-trips.
+    - Events published while Redis is unreachable are logged and lost (no broker to hold them).
+    """
+
+    name = "redis"
+
+    async def connect(self):
+        await ws_manager.pubsub.connect()
+
+    async def close(self):
+        await ws_manager.batcher.drain(timeout=DRAIN_TIMEOUT)
+
+    async def publish(self, list_id: int, event: Dict[str, Any]):
+        # access-control events skip the pipeline batch
+        published = await ws_manager.dispatch_task_event(list_id, event, priority=is_control_event(event))
+        published.add_done_callback(self._log_failure)
+
+    @staticmethod
+    def _log_failure(future: asyncio.Future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Failed to publish event to Redis: {future.exception()}")
@@ -0,0 +1,124 @@
+"""
+Versioned list events and their wire format on the event bus.
+
+Every event has an `action` and one payload object limited to the fields declared for
+its type below, so new database columns never leak onto the bus. Dates and times
+travel as ISO strings.
+
+On the bus an event is msgpack (or JSON, with EVENT_ENCODING=json for debugging),
+named by the message content type, and carries the schema version in `v`. None fields
+are left out and restored on decode, so sockets see the same shape either way.
+
+Rolling upgrades: readers accept their own version, older ones (unversioned JSON from
+before the schema counts as 0) and ignore fields they do not know. A newer version is
+refused with UnsupportedEventVersion. The consumer then postpones the event through the
+longest retry delay, without counting an attempt, until an upgraded worker takes it.
+Roll workers out before the API.
+"""
+import json
+from datetime import date, datetime, time
+
+import msgpack
+
+from src.todolist.config import EVENT_ENCODING
+
+from typing import Any, Dict, Optional, Tuple
+
+SCHEMA_VERSION = 1
+
+CONTENT_TYPE_MSGPACK = "application/msgpack"
+CONTENT_TYPE_JSON = "application/json"
+
+TASK_ADDED = "task_added"
+TASK_UPDATED = "task_updated"
+TASK_DELETED = "task_deleted"
+LIST_UPDATED = "list_title_update"
+LIST_DELETED = "list_deleted"
+MEMBER_ADDED = "user_added"
+MEMBER_REMOVED = "user_removed"
+
+TASK_FIELDS = (
+    "id", "list_id", "task_title", "task_details", "due_date", "start_time",
+    "is_completed", "is_starred", "created_at", "updated_at",
+)
+LIST_FIELDS = ("id", "title", "updated_at")
+MEMBER_FIELDS = ("id", "user_id", "list_id", "role", "user")
+
+# action -> (payload key, payload fields)
+EVENT_TYPES: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    TASK_ADDED: ("task", TASK_FIELDS),
+    TASK_UPDATED: ("task", TASK_FIELDS),
+    TASK_DELETED: ("task", ("id",)),
+    LIST_UPDATED: ("task", LIST_FIELDS),  # the frontend reads list updates from "task"
+    LIST_DELETED: ("list", ("id",)),
+    MEMBER_ADDED: ("member", MEMBER_FIELDS),
+    MEMBER_REMOVED: ("member", ("user_id",)),
+}
+
+
+# access-control events, carried on the priority lanes ahead of task traffic
+CONTROL_ACTIONS = frozenset({MEMBER_ADDED, MEMBER_REMOVED, LIST_DELETED})
+
+
+def is_control_event(event: Dict[str, Any]) -> bool:
+    return event.get("action") in CONTROL_ACTIONS
+
+
+class UnsupportedEventVersion(ValueError):
+    """The event was written by a newer schema than this process understands."""
+
+
+def _wire_value(value: Any) -> Any:
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return value
+
+
+def make_event(action: str, source: Any) -> Dict[str, Any]:
+    """Event of a declared type, built from a model or dict with only that type's fields."""
+    key, fields = EVENT_TYPES[action]
+    get = source.get if isinstance(source, dict) else (lambda name: getattr(source, name, None))
+    return {"action": action, key: {name: _wire_value(get(name)) for name in fields}}
+
+
+def _compact(event: Dict[str, Any]) -> Dict[str, Any]:
+    payload_key = EVENT_TYPES.get(event.get("action"), (None,))[0]
+    payload = event.get(payload_key)
+    if not isinstance(payload, dict):
+        return event
+    return {**event, payload_key: {k: v for k, v in payload.items() if v is not None}}
+
+
+def _restore(event: Dict[str, Any]) -> Dict[str, Any]:
+    payload_key, fields = EVENT_TYPES.get(event.get("action"), (None, ()))
+    payload = event.get(payload_key)
+    if isinstance(payload, dict):
+        for name in fields:
+            payload.setdefault(name, None)
+    return event
+
+
+def encode_event(event: Dict[str, Any], encoding: str = EVENT_ENCODING) -> Tuple[bytes, str]:
+    """Body and content type of an event on the bus."""
+    wire = {"v": SCHEMA_VERSION, **_compact(event)}
+    if encoding == "json":
+        return json.dumps(wire, separators=(",", ":"), default=str).encode(), CONTENT_TYPE_JSON
+    return msgpack.packb(wire, use_bin_type=True, default=str), CONTENT_TYPE_MSGPACK
+
+
+def decode_event(body: bytes, content_type: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Event from a bus message; a missing content type means JSON.
+    Raises UnsupportedEventVersion for events from a newer schema, ValueError for anything unreadable.
+    """
+    if content_type == CONTENT_TYPE_MSGPACK:
+        event = msgpack.unpackb(body, raw=False)
+    else:
+        event = json.loads(body)
+    if not isinstance(event, dict):
+        raise ValueError("event is not a map")
+
+    version = event.pop("v", 0)
+    if not isinstance(version, int) or version > SCHEMA_VERSION:
+        raise UnsupportedEventVersion(f"event schema v{version} is newer than v{SCHEMA_VERSION}")
+    return _restore(event)
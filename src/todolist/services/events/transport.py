@@ -0,0 +1,19 @@
+from src.todolist.config import EVENT_TRANSPORT
+from src.todolist.services.events.base import EventTransport
+
+
+def create_event_transport(name: str = EVENT_TRANSPORT) -> EventTransport:
+    """Build the backend selected by EVENT_TRANSPORT; each one imports only what it needs."""
+    if name == "rabbitmq":
+        from src.todolist.services.events.rabbitmq import RabbitEventTransport
+        return RabbitEventTransport()
+    if name == "redis":
+        from src.todolist.services.events.redis_direct import RedisEventTransport
+        return RedisEventTransport()
+    if name == "memory":
+        from src.todolist.services.events.memory import InMemoryEventTransport
+        return InMemoryEventTransport()
+    raise ValueError(f"Unknown EVENT_TRANSPORT {name!r} (expected rabbitmq, redis or memory)")
+
+
+event_transport = create_event_transport()
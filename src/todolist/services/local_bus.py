@@ -0,0 +1,76 @@
+import asyncio
+import logging
+
+from typing import Callable, Dict, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+LOCAL_BUS_QUEUE_SIZE = 10000
+
+
+class LocalPubSubManager:
+    """
+    In-process stand-in for RedisPubSubManager, for single-node runs and tests.
+    - Same subscribe/publish interface, but rooms only reach callbacks in this process.
+    - publish() only enqueues; one dispatch task delivers messages in publish order.
+    """
+
+    def __init__(self, queue_size: int = LOCAL_BUS_QUEUE_SIZE):
+        self.room_callbacks: Dict[str, Set[Callable]] = {}  # room_id -> set of async callbacks
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._dispatch_task: asyncio.Task | None = None
+
+    async def _get_redis_connection(self):
+        raise RuntimeError("The in-memory event bus has no Redis connection")
+
+    def _ensure_dispatcher(self):
+        if not self._dispatch_task or self._dispatch_task.done():
+            self._dispatch_task = asyncio.create_task(self._dispatch_loop())
+            logger.info("Started in-memory event bus")
+
+    async def connect(self):
+        self._ensure_dispatcher()
+
+    async def publish(self, room_id: str, message: str):
+        """Queue a message for a room; waits only while the bus is full."""
+        self._ensure_dispatcher()
+        await self._queue.put((room_id, message))
+
+    async def publish_many(self, messages: List[Tuple[str, str]]):
+        for room_id, message in messages:
+            await self.publish(room_id, message)
+
+    async def subscribe(self, room_id: str, callback: Callable[[str], None]):
+        self.room_callbacks.setdefault(room_id, set()).add(callback)
+
+    async def unsubscribe(self, room_id: str, callback: Callable[[str], None]):
+        callbacks = self.room_callbacks.get(room_id)
+        if callbacks is not None:
+            callbacks.discard(callback)
+            if not callbacks:
+                del self.room_callbacks[room_id]
+
+    async def _dispatch_loop(self):
+        while True:
+            room_id, message = await self._queue.get()
+            try:
+                for callback in list(self.room_callbacks.get(room_id, ())):
+                    try:
+                        await callback(message)
+                    except Exception as e:
+                        logger.error(f"Room callback failed for {room_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def drain(self, timeout: float):
+        """Wait (up to `timeout` seconds) until every queued message was delivered."""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Gave up delivering {self._queue.qsize()} in-memory events")
+
+    async def close(self):
+        if self._dispatch_task:
+            self._dispatch_task.cancel()
+            self._dispatch_task = None
+        logger.info("In-memory event bus closed")
@@ -1,13 +1,37 @@
 import os
+import argparse
 import logging
-import json
 import asyncio
 import signal
-from datetime import datetime, timezone
+import time
 
 import aio_pika
+from prometheus_client import start_http_server
 from src.todolist.websocket.manager import ws_manager
-from src.todolist.config import RABBIT_URL
+from src.todolist.config import (
+    RABBIT_URL,
+    RABBIT_NUM_SHARDS,
+    RABBIT_CONSUMER_SHARDS,
+    RABBIT_CONSUMER_PREFETCH,
+    RABBIT_CONSUMER_LANES,
+    RABBIT_CONTROL_PREFETCH,
+    RABBIT_CONTROL_LANES,
+    RABBIT_METRICS_PORT
+)
+from src.todolist.metrics import (
+    CONSUMER_EVENTS,
+    CONSUMER_PROCESSING_LATENCY,
+    CONSUMER_EVENT_AGE,
+    CONSUMER_INFLIGHT
+)
+from src.todolist.services.events.schema import UnsupportedEventVersion, decode_event, is_control_event
+from src.todolist.services.rabbitmq.executor import KeyedExecutor, OrderedAcker
+from src.todolist.services.rabbitmq.lag import QueueDepthSampler, event_age
+from src.todolist.services.rabbitmq.retry import RetryPolicy
+from src.todolist.services.rabbitmq.shards import control_queue_name, declare_shards, parse_shards, shard_queue_name
+from src.todolist.services.redis_manager import NOT_PUBLISHED
+
+from typing import List, Set
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
@@ -16,11 +40,11 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-EXCHANGE_NAME = "list_updates_sharded"
-NUM_SHARDS = 4
-SHARD_INDEX = 0
-QUEUE_NAME = f"list_updates_shard_{SHARD_INDEX}"
-PREFETCH_COUNT = 1
+NUM_SHARDS = RABBIT_NUM_SHARDS
+PREFETCH_COUNT = RABBIT_CONSUMER_PREFETCH
+LANES = RABBIT_CONSUMER_LANES
+CONTROL_PREFETCH = RABBIT_CONTROL_PREFETCH
+CONTROL_LANES = RABBIT_CONTROL_LANES
 
 running = True
 
@@ -34,35 +58,35 @@ def handle_signal(signum, frame):
 signal.signal(signal.SIGINT, handle_signal)
 signal.signal(signal.SIGTERM, handle_signal)
 
-# Shard routing key helper
-def shard_routing_key(shard_idx: int) -> str:
-    return f"shard.{shard_idx}"
-
-# Process one message
-async def process_message(body_bytes: bytes):
+def decode_message(body_bytes: bytes, content_type: str | None = None) -> dict | None:
     """
-    Deserialize message from RabbitMQ and broadcast via ws_manager.
+    Event carried by a RabbitMQ message, or None if it cannot be routed.
+    Raises UnsupportedEventVersion for events a newer worker must handle.
     """
     try:
-        msg = json.loads(body_bytes.decode())
-        list_id = msg.get("list_id")
-        if list_id is None:
-            logger.info(f"[worker] Malformed message (missing list_id): {msg}")
-            return
+        msg = decode_event(body_bytes, content_type)
+    except UnsupportedEventVersion:
+        raise
+    except Exception as e:
+        logger.info(f"[worker] Undecodable message: {e}")
+        return None
 
-        # Broadcast using WebSocket manager
-        try:
-            await ws_manager.broadcast_task_event(list_id, msg)
-            logger.info(f"[{datetime.now(timezone.utc).isoformat()}] Broadcasted event for list {list_id}")
-        except Exception as e:
-            logger.info("[worker] Failed to broadcast to Redis:", e)
+    if not isinstance(msg, dict) or msg.get("list_id") is None:
+        logger.info(f"[worker] Malformed message (missing list_id): {msg}")
+        return None
+    return msg
 
 
-    except Exception as e:
-        logger.info("[worker] Error processing message:", e)
+async def handle_event(msg: dict) -> asyncio.Future | None:
+    """
+    Queue one decoded event for broadcast via ws_manager's Redis pipeline;
+    access-control events are published straight away instead.
+    Returns a future that resolves once it reached Redis, to NOT_PUBLISHED if nobody watches the list.
+    """
+    return await ws_manager.dispatch_task_event(msg["list_id"], msg, priority=is_control_event(msg))
 
 
-async def main():
+async def main(shards: List[int]):
     global running
 
     # Connect Redis via ws_manager's pubsub
@@ -78,29 +102,157 @@ async def main():
             logger.info("[worker] RabbitMQ connection failed, retrying in 2s...", e)
             await asyncio.sleep(2)
 
-    # Declare exchange and queue
-    exchange = await channel.declare_exchange(EXCHANGE_NAME, aio_pika.ExchangeType.DIRECT, durable=True)
-    queue = await channel.declare_queue(QUEUE_NAME, durable=True)
-    routing_key = shard_routing_key(SHARD_INDEX)
-    await queue.bind(exchange, routing_key)
-
+    # Prefetch applies per consumer; it bounds how many events are in flight across the lanes
     await channel.set_qos(prefetch_count=PREFETCH_COUNT)
 
-    logger.info(f"[worker] Started. Serving shard {SHARD_INDEX} -> queue '{QUEUE_NAME}' bound to '{routing_key}'")
+    # Declare exchange and every shard queue (idempotent), then consume ours
+    await declare_shards(channel, NUM_SHARDS)
+
+    # Failed events are republished to a delay queue or the dead-letter queue, never
+    # requeued in place; the copy is confirmed before the original is acked
+    retry_channel = await connection.channel(publisher_confirms=True)
+    retry = RetryPolicy()
+    await retry.setup(retry_channel)
+
+    # Events run concurrently in lanes keyed by list, so each list stays in order;
+    # acks go back in delivery order whatever order the lanes finish in.
+    # Access-control events get their own channel, prefetch window, lanes and acks,
+    # so a revocation never waits behind a burst of task edits.
+    control_channel = await connection.channel()
+    await control_channel.set_qos(prefetch_count=CONTROL_PREFETCH)
+    executor = KeyedExecutor(LANES)
+    control_executor = KeyedExecutor(CONTROL_LANES)
+    acker = OrderedAcker(on_failure=retry.failed)
+    control_acker = OrderedAcker(on_failure=retry.failed)
+    executor.start()
+    control_executor.start()
+    # tags restart when a robust channel reopens; what was in flight is redelivered
+    channel.close_callbacks.add(lambda _channel, _exc: acker.reset())
+    control_channel.close_callbacks.add(lambda _channel, _exc: control_acker.reset())
+
+    # the loop only keeps weak references to tasks; a lost finish() would stall the acker
+    settling: Set[asyncio.Task] = set()
+
+    def spawn(coro):
+        task = asyncio.create_task(coro)
+        settling.add(task)
+        task.add_done_callback(settling.discard)
 
-    # Message handler callback
-    async with queue.iterator() as queue_iter:
-        async for message in queue_iter:
-            if not running:
-                break
-            async with message.process(requeue=True):
-                await process_message(message.body)
+    # Per-shard outcomes, latency and event age here; queue depth sampled from the broker
+    if RABBIT_METRICS_PORT:
+        start_http_server(RABBIT_METRICS_PORT)
+    CONSUMER_INFLIGHT.set_function(lambda: acker.pending + control_acker.pending)
+    lag_channel = await connection.channel()
+    lag_sampler = asyncio.create_task(
+        QueueDepthSampler(
+            lag_channel,
+            [shard_queue_name(i) for i in shards] + [control_queue_name(i) for i in shards],
+        ).run()
+    )
 
-    # Close connections on shutdown
+    def on_message_for(shard: str, executor: KeyedExecutor, acker: OrderedAcker):
+        async def on_message(message: aio_pika.abc.AbstractIncomingMessage):
+            delivered_at = time.monotonic()
+            acker.track(message)
+
+            async def finish(result: str, ok: bool = True, error: str | None = None):
+                CONSUMER_EVENTS.labels(shard=shard, result=result).inc()
+                if result == "ok":
+                    CONSUMER_PROCESSING_LATENCY.labels(shard=shard).observe(time.monotonic() - delivered_at)
+                    age = event_age(message)
+                    if age is not None:
+                        CONSUMER_EVENT_AGE.labels(shard=shard).observe(age)
+                await acker.done(message, ok=ok, error=error)
+
+            try:
+                msg = decode_message(message.body, message.content_type)
+            except UnsupportedEventVersion as e:
+                # not poison: postponed, without using up retries, until an upgraded worker takes it
+                await finish("unsupported", ok=await retry.postpone(message, str(e)))
+                return
+            if msg is None:
+                # retrying cannot fix a payload we cannot read
+                await finish("undecodable", ok=await retry.dead_letter(message, "undecodable or missing list_id"))
+                return
+
+            def settle(published: asyncio.Future):
+                # a cancelled publish must still settle, or the acker stalls behind it
+                if published.cancelled():
+                    spawn(finish("failed", ok=False, error="publish cancelled"))
+                    return
+                error = published.exception()
+                if error is None:
+                    spawn(finish("skipped" if published.result() == NOT_PUBLISHED else "ok"))
+                else:
+                    spawn(finish("failed", ok=False, error=str(error)))
+
+            async def job():
+                # the lane moves on once the event is queued; the ack waits for its pipeline
+                try:
+                    published = await handle_event(msg)
+                except Exception as e:
+                    await finish("failed", ok=False, error=str(e))
+                    return
+                published.add_done_callback(settle)
+
+            executor.submit(msg["list_id"], job)
+
+        return on_message
+
+    consumers = []
+    for shard_idx in shards:
+        queue = await channel.declare_queue(shard_queue_name(shard_idx), durable=True)
+        consumers.append((queue, await queue.consume(on_message_for(str(shard_idx), executor, acker))))
+        control = await control_channel.declare_queue(control_queue_name(shard_idx), durable=True)
+        consumers.append((control, await control.consume(
+            on_message_for(f"{shard_idx}-control", control_executor, control_acker)
+        )))
+
+    logger.info(
+        f"[worker] Started. Serving shards {shards} of {NUM_SHARDS} with {LANES} lanes, prefetch {PREFETCH_COUNT}"
+        f" ({CONTROL_LANES} control lanes, prefetch {CONTROL_PREFETCH})"
+    )
+
+    while running:
+        await asyncio.sleep(0.5)
+
+    # Stop deliveries, then finish what was already delivered before letting go of the channel
+    for queue, consumer_tag in consumers:
+        await queue.cancel(consumer_tag)
+    try:
+        await asyncio.wait_for(asyncio.gather(executor.join(), control_executor.join()), timeout=10)
+    except asyncio.TimeoutError:
+        pass
+    await executor.stop()
+    await control_executor.stop()
+    await ws_manager.batcher.drain(timeout=5)
+    await asyncio.sleep(0)  # let settle callbacks spawn their acks
+    if settling:
+        await asyncio.wait(set(settling), timeout=5)
+    unfinished = acker.pending + control_acker.pending
+    if unfinished:
+        logger.info(f"[worker] {unfinished} events unfinished at shutdown, they will be redelivered")
+
+    # Close connections on shutdown; unacked messages are redelivered
+    lag_sampler.cancel()
+    await lag_channel.close()
+    await retry_channel.close()
+    await control_channel.close()
     await channel.close()
     await connection.close()
     logger.info("[worker] Stopped.")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fan list events out from RabbitMQ shard queues to WebSocket servers.")
+    parser.add_argument(
+        "--shards",
+        default=RABBIT_CONSUMER_SHARDS,
+        help='shards to serve, e.g. "0,2" or "1-3"; defaults to RABBIT_CONSUMER_SHARDS, else all',
+    )
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    args = parse_args()
+    asyncio.run(main(parse_shards(args.shards, NUM_SHARDS)))
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+from collections import deque
+
+import aio_pika
+
+from typing import Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class KeyedExecutor:
+    """
+    Runs jobs concurrently across a fixed number of lanes.
+    Jobs with the same key always land in the same lane and run one after another,
+    so per-key order is kept while different keys proceed in parallel.
+    """
+
+    def __init__(self, lanes: int):
+        self.lanes = max(1, lanes)
+        self._queues: List[asyncio.Queue] = [asyncio.Queue() for _ in range(self.lanes)]
+        self._workers: List[asyncio.Task] = []
+
+    def start(self):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._run(queue)) for queue in self._queues]
+
+    def submit(self, key: Hashable, job: Callable[[], Awaitable[None]]):
+        """Queue `job` behind earlier jobs with the same key. Never blocks."""
+        self._queues[hash(key) % self.lanes].put_nowait(job)
+
+    async def _run(self, queue: asyncio.Queue):
+        while True:
+            job = await queue.get()
+            try:
+                await job()
+            except Exception as e:
+                logger.error(f"[worker] Job failed: {e}")
+            finally:
+                queue.task_done()
+
+    async def join(self):
+        """Wait until every queued job has run."""
+        await asyncio.gather(*(queue.join() for queue in self._queues))
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+
+class OrderedAcker:
+    """
+    Acks messages in delivery order although they finish out of order.
+    Only the finished prefix is settled, with one multiple-ack per run of successes,
+    so a redelivery after a crash never skips an unprocessed message.
+    Failures go to `on_failure` first; if it moved the message elsewhere (a retry or
+    dead-letter queue) it is acked like a success, otherwise it is requeued.
+    Delivery tags restart when a channel reopens, so results are kept per message object,
+    and messages no longer tracked (delivered before a reset()) are ignored.
+    """
+
+    def __init__(
+        self,
+        on_failure: Optional[Callable[[aio_pika.abc.AbstractIncomingMessage, Optional[str]], Awaitable[bool]]] = None,
+    ):
+        self.on_failure = on_failure
+        self._inflight: Deque[aio_pika.abc.AbstractIncomingMessage] = deque()
+        self._results: Dict[int, bool] = {}  # id of a tracked message -> processed ok
+        self._tracked: Set[int] = set()  # ids of the messages in _inflight
+        self._lock = asyncio.Lock()  # acks must reach the broker in tag order
+
+    def track(self, message: aio_pika.abc.AbstractIncomingMessage):
+        """Register a message at delivery, before it is handed to a lane."""
+        self._inflight.append(message)
+        self._tracked.add(id(message))
+
+    def reset(self):
+        """Forget every tracked message, e.g. when its channel closed; the broker redelivers them."""
+        self._inflight.clear()
+        self._tracked.clear()
+        self._results.clear()
+
+    async def done(self, message: aio_pika.abc.AbstractIncomingMessage, ok: bool = True, error: str | None = None):
+        """Record a finished message and settle whatever prefix is now complete."""
+        if id(message) not in self._tracked:
+            return
+        if not ok and self.on_failure is not None:
+            ok = await self.on_failure(message, error)
+        if id(message) not in self._tracked:
+            return
+        self._results[id(message)] = ok
+        async with self._lock:
+            await self._settle()
+
+    async def _settle(self):
+        last_ok = None
+        try:
+            while self._inflight and id(self._inflight[0]) in self._results:
+                head = self._inflight.popleft()
+                self._tracked.discard(id(head))
+                if self._results.pop(id(head)):
+                    last_ok = head
+                    continue
+                if last_ok is not None:
+                    await last_ok.ack(multiple=True)
+                    last_ok = None
+                await head.nack(requeue=True)
+            if last_ok is not None:
+                await last_ok.ack(multiple=True)
+        except Exception as e:
+            # the channel was lost; the broker redelivers everything unacked
+            logger.error(f"[worker] Failed to settle messages: {e}")
+            self.reset()
+
+    @property
+    def pending(self) -> int:
+        return len(self._inflight)
@@ -0,0 +1,177 @@
+"""
+Queue lag signals for autoscaling consumers.
+
+Every event carries the wall-clock time the API published it (`published-at` header, ms),
+so consumers can report end-to-end event age next to their own processing latency.
+Queue depth comes from the broker, sampled two ways:
+
+- QueueDepthSampler: passive queue declares over AMQP. Ready messages and consumers only,
+  no plugin needed. The consumer runs one for the shards it serves.
+- ManagementSampler: the RabbitMQ management API (RABBIT_MANAGEMENT_URL). Adds unacked
+  messages, broker-side publish / deliver / ack rates and the estimated drain time.
+
+Run as a sidecar, exporting every shard, retry and dead-letter queue:
+
+  python -m src.todolist.services.rabbitmq.lag --port 9103
+"""
+import argparse
+import asyncio
+import logging
+import time
+from urllib.parse import quote, urlparse
+
+import aio_pika
+import httpx
+from prometheus_client import start_http_server
+
+from src.todolist.config import (
+    RABBIT_URL,
+    RABBIT_NUM_SHARDS,
+    RABBIT_LAG_POLL_INTERVAL,
+    RABBIT_MANAGEMENT_URL
+)
+from src.todolist.metrics import (
+    RABBIT_QUEUE_MESSAGES,
+    RABBIT_QUEUE_CONSUMERS,
+    RABBIT_QUEUE_RATE,
+    RABBIT_QUEUE_DRAIN_SECONDS
+)
+from src.todolist.services.rabbitmq.retry import DEAD_QUEUE, declare_retry_topology, delay_queue_name, retry_delays
+from src.todolist.services.rabbitmq.shards import control_queue_name, declare_shards, shard_queue_name
+
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+PUBLISHED_AT_HEADER = "published-at"
+MIN_ACK_RATE = 0.01  # below this a backlog is reported as not draining at all
+NOT_DRAINING = float("inf")
+
+
+def published_at(message: aio_pika.abc.AbstractIncomingMessage) -> Optional[float]:
+    """Wall-clock publish time of an event in seconds, if the publisher stamped it."""
+    value = (message.headers or {}).get(PUBLISHED_AT_HEADER)
+    try:
+        return int(value) / 1000 if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def event_age(message: aio_pika.abc.AbstractIncomingMessage) -> Optional[float]:
+    """Seconds since the event was published; clock skew between hosts is clamped to zero."""
+    sent = published_at(message)
+    return max(0.0, time.time() - sent) if sent is not None else None
+
+
+def all_queues(num_shards: int = RABBIT_NUM_SHARDS) -> List[str]:
+    return (
+        [shard_queue_name(i) for i in range(num_shards)]
+        + [control_queue_name(i) for i in range(num_shards)]
+        + [delay_queue_name(ms) for ms in retry_delays()]
+        + [DEAD_QUEUE]
+    )
+
+
+class QueueDepthSampler:
+    """Ready messages and consumer count per queue, from passive declares on a dedicated channel."""
+
+    def __init__(self, channel: aio_pika.abc.AbstractChannel, queues: List[str], interval: float = RABBIT_LAG_POLL_INTERVAL):
+        self.channel = channel
+        self.queues = queues
+        self.interval = interval
+
+    async def sample(self):
+        for name in self.queues:
+            queue = await self.channel.declare_queue(name, passive=True)
+            result = queue.declaration_result
+            RABBIT_QUEUE_MESSAGES.labels(queue=name, state="ready").set(result.message_count)
+            RABBIT_QUEUE_CONSUMERS.labels(queue=name).set(result.consumer_count)
+
+    async def run(self):
+        while True:
+            try:
+                await self.sample()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[lag] Queue depth sample failed: {e}")
+            await asyncio.sleep(self.interval)
+
+
+class ManagementSampler:
+    """
+    Depth, unacked, consumers and broker-side rates per queue from the management API.
+    The broker averages rates over its own sample window (5s by default).
+    """
+
+    def __init__(
+        self,
+        queues: List[str],
+        management_url: str = RABBIT_MANAGEMENT_URL,
+        rabbit_url: str = RABBIT_URL,
+        interval: float = RABBIT_LAG_POLL_INTERVAL,
+    ):
+        parsed = urlparse(management_url)
+        self.base_url = f"{parsed.scheme}://{parsed.hostname}:{parsed.port or 15672}"
+        self.auth = (parsed.username or "guest", parsed.password or "guest")
+        self.vhost = quote(urlparse(rabbit_url).path.lstrip("/") or "/", safe="")
+        self.queues = queues
+        self.interval = interval
+
+    async def sample(self, client: httpx.AsyncClient):
+        for name in self.queues:
+            response = await client.get(f"{self.base_url}/api/queues/{self.vhost}/{quote(name, safe='')}")
+            if response.status_code == 404:
+                continue
+            response.raise_for_status()
+            info = response.json()
+            stats = info.get("message_stats") or {}
+
+            ready = info.get("messages_ready", 0)
+            RABBIT_QUEUE_MESSAGES.labels(queue=name, state="ready").set(ready)
+            RABBIT_QUEUE_MESSAGES.labels(queue=name, state="unacked").set(info.get("messages_unacknowledged", 0))
+            RABBIT_QUEUE_CONSUMERS.labels(queue=name).set(info.get("consumers", 0))
+            rates = {}
+            for kind, key in (("publish", "publish_details"), ("deliver", "deliver_get_details"), ("ack", "ack_details")):
+                rates[kind] = (stats.get(key) or {}).get("rate", 0.0)
+                RABBIT_QUEUE_RATE.labels(queue=name, kind=kind).set(rates[kind])
+            drain = 0.0 if not ready else (ready / rates["ack"] if rates["ack"] >= MIN_ACK_RATE else NOT_DRAINING)
+            RABBIT_QUEUE_DRAIN_SECONDS.labels(queue=name).set(drain)
+
+    async def run(self):
+        async with httpx.AsyncClient(auth=self.auth, timeout=self.interval) as client:
+            while True:
+                try:
+                    await self.sample(client)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"[lag] Management API sample failed: {e}")
+                await asyncio.sleep(self.interval)
+
+
+async def main(port: int):
+    start_http_server(port)
+    queues = all_queues()
+    if RABBIT_MANAGEMENT_URL:
+        logger.info(f"[lag] Exporting {len(queues)} queues from the management API on :{port}")
+        await ManagementSampler(queues).run()
+        return
+
+    connection = await aio_pika.connect_robust(RABBIT_URL)
+    try:
+        channel = await connection.channel()
+        # a passive declare of a missing queue would close the channel
+        await declare_shards(channel, RABBIT_NUM_SHARDS)
+        await declare_retry_topology(channel)
+        logger.info(f"[lag] Exporting {len(queues)} queues over AMQP on :{port}")
+        await QueueDepthSampler(channel, queues).run()
+    finally:
+        await connection.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Export RabbitMQ queue lag for list events to Prometheus.")
+    parser.add_argument("--port", type=int, default=9103, help="port of the /metrics endpoint")
+    asyncio.run(main(parser.parse_args().port))
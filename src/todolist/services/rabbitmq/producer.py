@@ -1,17 +1,42 @@
 # src/todolist/messaging/rabbitmq_aio.py
-import json
-import hashlib
-import uuid
+import asyncio
 import logging
-from datetime import datetime
-from typing import Any, Dict, Optional
+import time
+from typing import Any, Dict, List, Optional
 
 import aio_pika
-from src.todolist.config import RABBIT_URL
-
+from src.todolist.config import (
+    RABBIT_URL,
+    RABBIT_NUM_SHARDS,
+    RABBIT_CHANNEL_POOL_SIZE,
+    RABBIT_PUBLISH_QUEUE_SIZE,
+    RABBIT_PUBLISH_BATCH_SIZE,
+    RABBIT_PUBLISH_ENQUEUE_TIMEOUT_MS,
+    RABBIT_PUBLISH_MAX_RETRIES,
+    RABBIT_PUBLISH_TIMEOUT,
+    RABBIT_PUBLISH_FLUSH_TIMEOUT,
+    RABBIT_RECONNECT_INTERVAL
+)
+from src.todolist.metrics import (
+    RABBIT_PUBLISH_QUEUE_DEPTH,
+    RABBIT_PUBLISHED,
+    RABBIT_PUBLISH_BATCH,
+    RABBIT_PUBLISH_LATENCY,
+    RABBIT_SPOOLED
+)
+from src.todolist.services.events.schema import encode_event, is_control_event
+from src.todolist.services.rabbitmq.lag import PUBLISHED_AT_HEADER
+from src.todolist.services.rabbitmq.spool import SegmentSpool
+from src.todolist.services.rabbitmq.shards import (
+    EXCHANGE_NAME,
+    declare_shards,
+    shard_for_list,
+    control_routing_key,
+    shard_routing_key
+)
 
-EXCHANGE_NAME = "list_updates_sharded"
-NUM_SHARDS = 4
+NUM_SHARDS = RABBIT_NUM_SHARDS
+RETRY_BACKOFF = 0.5  # seconds, doubled per attempt
 
 logging.basicConfig(
     level=logging.INFO,
@@ -20,73 +45,343 @@ logging.basicConfig(
 )
 
 logger = logging.getLogger(__name__)
+
+
+class _PendingPublish:
+    __slots__ = ("routing_key", "body", "content_type", "enqueued_at", "published_at_ms", "attempts")
+
+    def __init__(self, routing_key: str, body: bytes, content_type: str):
+        self.routing_key = routing_key
+        self.body = body
+        self.content_type = content_type
+        self.enqueued_at = time.monotonic()
+        self.published_at_ms = int(time.time() * 1000)  # wall clock, for end-to-end event age
+        self.attempts = 0
+
+
 class AsyncRabbitPublisher:
     """
     Async RabbitMQ publisher using aio_pika.
     - Designed for FastAPI async environment.
-    - Call connect() at startup (lifespan) and close() at shutdown.
+    - Call start() at startup (lifespan) and close() at shutdown.
+    - publish_sharded_event() only encodes and enqueues; one background task per pooled
+      channel publishes batches and waits for the broker's confirms (at-least-once).
+    - A list always uses the same channel, so its events keep their order.
+    - Access-control events have their own queue and channel (the last of the pool) and
+      go to the shard's control queue, so they never wait behind task traffic.
+    - While RabbitMQ is unreachable events go to a disk spool, and new events queue behind
+      them until it has been replayed. Once connected, events reach the spool with the rest
+      of their queue: a batch that runs out of retries, or an event that waited too long for
+      room, takes the queue along, and later batches follow it while the spool is not empty,
+      so every list keeps its order.
     """
 
-    def __init__(self, rabbit_url: str = RABBIT_URL, exchange_name: str = EXCHANGE_NAME, num_shards: int = NUM_SHARDS):
+    def __init__(
+        self,
+        rabbit_url: str = RABBIT_URL,
+        exchange_name: str = EXCHANGE_NAME,
+        num_shards: int = NUM_SHARDS,
+        pool_size: int = RABBIT_CHANNEL_POOL_SIZE,
+        queue_size: int = RABBIT_PUBLISH_QUEUE_SIZE,
+        batch_size: int = RABBIT_PUBLISH_BATCH_SIZE,
+    ):
         self.rabbit_url = rabbit_url
         self.exchange_name = exchange_name
         self.num_shards = num_shards
+        self.pool_size = max(1, pool_size)
+        self.batch_size = batch_size
+        self.enqueue_timeout = RABBIT_PUBLISH_ENQUEUE_TIMEOUT_MS / 1000
 
         self.connection: Optional[aio_pika.RobustConnection] = None
         self.channel: Optional[aio_pika.RobustChannel] = None
         self.exchange: Optional[aio_pika.Exchange] = None
 
+        self._channels: List[aio_pika.abc.AbstractChannel] = []
+        self._exchanges: List[aio_pika.abc.AbstractExchange] = []
+        # one queue per pooled channel, plus the control queue at index pool_size
+        self._queues: List[asyncio.Queue] = [
+            asyncio.Queue(maxsize=max(1, queue_size // self.pool_size)) for _ in range(self.pool_size + 1)
+        ]
+        self._workers: List[asyncio.Task] = []
+        self._inflight: Dict[int, List[_PendingPublish]] = {}  # worker index -> unconfirmed batch
+
+        self.spool = SegmentSpool()
+        self._spool_wakeup = asyncio.Event()
+        self._replay_task: Optional[asyncio.Task] = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """
+        Open the spool and connect. Never raises: without a broker, events are spooled
+        and connecting is retried in the background.
+        """
+        self._open_spool()
+        try:
+            await self.connect()
+        except Exception as e:
+            logger.error(f"[publisher] RabbitMQ unavailable ({e}), spooling events until it is back")
+            self._reconnect_task = asyncio.create_task(self._reconnect_loop())
+        self._replay_task = asyncio.create_task(self._replay_loop())
+        self._spool_wakeup.set()
+
+    async def _reconnect_loop(self):
+        while not self._workers:
+            await asyncio.sleep(RABBIT_RECONNECT_INTERVAL)
+            try:
+                await self.connect()
+            except Exception as e:
+                logger.info(f"[publisher] RabbitMQ still unavailable: {e}")
+        self._spool_wakeup.set()
+
     async def connect(self):
-        """Establish connection, channel, and exchange."""
+        """
+        Establish connection, the channel pool with publisher confirms, and the exchange.
+        If setup fails after connecting, the connection is closed so its reconnects stop.
+        """
         self.connection = await aio_pika.connect_robust(self.rabbit_url)
-        self.channel = await self.connection.channel()
-        await self.channel.set_qos(prefetch_count=1)
-        self.exchange = await self.channel.declare_exchange(
-            self.exchange_name,
-            aio_pika.ExchangeType.DIRECT,
-            durable=True,
-        )
+        try:
+            self.channel = await self.connection.channel(publisher_confirms=True)
+            await self.channel.set_qos(prefetch_count=1)
+            self.exchange = await declare_shards(self.channel, self.num_shards, self.exchange_name)
+
+            self._channels = [self.channel]
+            self._exchanges = [self.exchange]
+            for _ in range(self.pool_size):
+                channel = await self.connection.channel(publisher_confirms=True)
+                self._channels.append(channel)
+                self._exchanges.append(await channel.get_exchange(self.exchange_name))
+        except Exception:
+            connection, self.connection = self.connection, None
+            self.channel, self.exchange = None, None
+            self._channels, self._exchanges = [], []
+            try:
+                await connection.close()
+            except Exception as e:
+                logger.error(f"[publisher] Closing the half-open connection failed: {e}")
+            raise
+
+        self._workers = [
+            asyncio.create_task(self._publish_loop(i)) for i in range(self.pool_size + 1)
+        ]
+        logger.info(f"[publisher] Connected with {self.pool_size} confirming channels and a control channel")
 
     async def close(self):
-        """Close channel and connection."""
-        if self.channel and not self.channel.is_closed:
-            await self.channel.close()
+        """
+        Flush queued events (bounded by RABBIT_PUBLISH_FLUSH_TIMEOUT), then close channels and connection.
+        What could not be flushed stays in the spool for the next start.
+        """
+        for task in (self._reconnect_task, self._replay_task):
+            if task:
+                task.cancel()
+        if self._workers:
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(*(queue.join() for queue in self._queues)),
+                    timeout=RABBIT_PUBLISH_FLUSH_TIMEOUT,
+                )
+            except asyncio.TimeoutError:
+                logger.error(f"[publisher] Spooling {self.pending} queued events that could not be flushed")
+            for worker in self._workers:
+                worker.cancel()
+            self._workers = []
+        # unconfirmed batches first, they are older than what is still queued
+        for index in range(len(self._queues)):
+            self._divert(index, list(self._inflight.pop(index, [])))
+        self.spool.close()
+
+        for channel in self._channels:
+            if not channel.is_closed:
+                await channel.close()
         if self.connection and not self.connection.is_closed:
             await self.connection.close()
 
+    @property
+    def pending(self) -> int:
+        return sum(queue.qsize() for queue in self._queues)
+
     def shard_for_list(self, list_id: int) -> int:
         """Deterministic shard computation for a list_id."""
-        # h = int(hashlib.sha256(str(list_id).encode()).hexdigest(), 16)
-        # return h % self.num_shards #TODO
-        return 0
+        return shard_for_list(list_id, self.num_shards)
 
 
-    def _routing_key_for_list(self, list_id: int) -> str:
+    def _routing_key_for_list(self, list_id: int, control: bool = False) -> str:
         shard = self.shard_for_list(list_id)
-        return f"shard.{shard}"
+        return control_routing_key(shard) if control else shard_routing_key(shard)
 
     async def publish_sharded_event(self, message: Dict[str, Any], list_id: int):
-        """Publish message to the correct shard asynchronously."""
-        logger.info("[publisher] Attempting to publish to RabbitMQ...")
-        if not self.exchange:
-            logger.info("[publisher] Exchange is None — call connect() first!")
-            raise RuntimeError("RabbitMQ exchange not connected. Call connect() first.")
-        
+        """
+        Queue a message for its shard; returns once it is queued, not once it is confirmed.
+        Waits up to RABBIT_PUBLISH_ENQUEUE_TIMEOUT_MS while the queue is full, then spools the
+        queue and the message behind it rather than holding up the request.
+        """
         if "list_id" not in message:
             message["list_id"] = list_id
 
-        routing_key = self._routing_key_for_list(list_id)
-        logger.info(f"[publisher] Using routing key: {routing_key}")
-        body = json.dumps(message, default=str).encode()
+        control = is_control_event(message)
+        pending = _PendingPublish(self._routing_key_for_list(list_id, control), *encode_event(message))
+        # never connected yet: nothing is queued, so the spool keeps the order
+        if not self._workers:
+            self._spool(pending)
+            return
+
+        index = self.pool_size if control else list_id % self.pool_size
+        queue = self._queues[index]
+        try:
+            queue.put_nowait(pending)
+        except asyncio.QueueFull:
+            # backpressure: spooling this event here would let it overtake the queued ones
+            try:
+                await asyncio.wait_for(queue.put(pending), timeout=self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                RABBIT_PUBLISHED.labels(result="queue_full").inc()
+                # the queued events go first, so the worker diverts whatever follows them
+                self._divert(index, [])
+                self._spool(pending)
+                return
+        RABBIT_PUBLISH_QUEUE_DEPTH.inc()
+
+    def _open_spool(self) -> bool:
+        try:
+            self.spool.open()
+            return True
+        except Exception as e:
+            logger.error(f"[publisher] Cannot open the event spool: {e}")
+            return False
+
+    def _spool(self, pending: _PendingPublish):
+        """Append an event to the disk spool; if the spool is full or unusable the event is lost."""
+        try:
+            spooled = self._open_spool() and self.spool.append(
+                (pending.routing_key, pending.content_type, pending.published_at_ms, pending.body)
+            )
+        except Exception as e:
+            logger.error(f"[publisher] Spool write failed: {e}")
+            spooled = False
+
+        if spooled:
+            RABBIT_SPOOLED.labels(result="spooled").inc()
+            self._spool_wakeup.set()
+        else:
+            RABBIT_SPOOLED.labels(result="dropped").inc()
+            logger.error(f"[publisher] Event spool full or unavailable, dropping event for {pending.routing_key}")
+
+    def _divert(self, index: int, entries: List[_PendingPublish]):
+        """Spool `entries` and then everything still queued for worker `index`, in order."""
+        queue = self._queues[index]
+        while not queue.empty():
+            entries.append(queue.get_nowait())
+        for pending in entries:
+            self._spool(pending)
+            RABBIT_PUBLISH_QUEUE_DEPTH.dec()
+            queue.task_done()
 
-        await self.exchange.publish(
-            aio_pika.Message(
-                body=body,
-                content_type="application/json",
-                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+    async def _replay_loop(self):
+        """Publish spooled events oldest first once connected; segments are deleted as they are confirmed."""
+        while True:
+            await self._spool_wakeup.wait()
+            self._spool_wakeup.clear()
+
+            while self._workers and not self.spool.empty:
+                records, offset = self.spool.read(self.batch_size)
+                if records:
+                    results = await asyncio.gather(
+                        *(
+                            self._exchanges[0].publish(
+                                aio_pika.Message(
+                                    body=body,
+                                    content_type=content_type,
+                                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                                    headers={PUBLISHED_AT_HEADER: published_at_ms},
+                                ),
+                                routing_key=routing_key,
+                                timeout=RABBIT_PUBLISH_TIMEOUT,
+                            )
+                            for routing_key, content_type, published_at_ms, body in records
+                        ),
+                        return_exceptions=True,
+                    )
+                    failed = [r for r in results if isinstance(r, BaseException)]
+                    if failed:
+                        # replay the whole batch again: duplicates are fine, gaps are not
+                        logger.error(f"[publisher] Spool replay failed ({failed[0]}), retrying in {RABBIT_RECONNECT_INTERVAL}s")
+                        await asyncio.sleep(RABBIT_RECONNECT_INTERVAL)
+                        continue
+                    RABBIT_SPOOLED.labels(result="replayed").inc(len(records))
+                self.spool.commit(offset)
+                if self.spool.empty:
+                    logger.info("[publisher] Spool replayed, publishing directly again")
+
+    async def _next_batch(self, queue: asyncio.Queue) -> List[_PendingPublish]:
+        batch = [await queue.get()]
+        while len(batch) < self.batch_size and not queue.empty():
+            batch.append(queue.get_nowait())
+        return batch
+
+    async def _publish_loop(self, index: int):
+        """Publish batches from one queue on one channel, in order, retrying what the broker did not confirm."""
+        queue = self._queues[index]
+        while True:
+            batch = await self._next_batch(queue)
+            if not self.spool.empty:
+                # older events are spooled: these go behind them, not past them
+                self._divert(index, batch)
+                continue
+            RABBIT_PUBLISH_BATCH.observe(len(batch))
+
+            while batch:
+                self._inflight[index] = batch
+                batch = await self._publish_batch(index, batch)
+                self._inflight[index] = batch
+                if batch:
+                    delay = RETRY_BACKOFF * 2 ** (batch[0].attempts - 1)
+                    logger.error(f"[publisher] {len(batch)} events unconfirmed, retrying in {delay}s")
+                    await asyncio.sleep(delay)
+
+    async def _publish_batch(self, index: int, batch: List[_PendingPublish]) -> List[_PendingPublish]:
+        """
+        Publish a batch with pipelined confirms; returns the entries to retry.
+        A publish stalled by a blocked connection times out after RABBIT_PUBLISH_TIMEOUT and is retried.
+        Once any entry runs out of retries, every unconfirmed entry is spooled with the queue tail.
+        """
+        exchange = self._exchanges[index]
+        results = await asyncio.gather(
+            *(
+                exchange.publish(
+                    aio_pika.Message(
+                        body=pending.body,
+                        content_type=pending.content_type,
+                        headers={PUBLISHED_AT_HEADER: pending.published_at_ms},
+                        delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                    ),
+                    routing_key=pending.routing_key,
+                    timeout=RABBIT_PUBLISH_TIMEOUT,
+                )
+                for pending in batch
             ),
-            routing_key=routing_key,
+            return_exceptions=True,
         )
-        logger.info("[publisher] Message published successfully.")
+
+        queue = self._queues[index]
+        retry = []
+        exhausted = None
+        now = time.monotonic()
+        for pending, result in zip(batch, results):
+            pending.attempts += 1
+            if not isinstance(result, BaseException):
+                RABBIT_PUBLISHED.labels(result="confirmed").inc()
+                RABBIT_PUBLISH_LATENCY.observe(now - pending.enqueued_at)
+                RABBIT_PUBLISH_QUEUE_DEPTH.dec()
+                queue.task_done()
+                continue
+            if pending.attempts >= RABBIT_PUBLISH_MAX_RETRIES and exhausted is None:
+                exhausted = result
+            retry.append(pending)
+
+        if exhausted is not None:
+            RABBIT_PUBLISHED.labels(result="spooled").inc(len(retry))
+            logger.error(f"[publisher] Spooling {len(retry)} events and the queue behind them after {RABBIT_PUBLISH_MAX_RETRIES} attempts: {exhausted}")
+            self._divert(index, retry)
+            return []
+        return retry
 
 rabbit_publisher = AsyncRabbitPublisher()
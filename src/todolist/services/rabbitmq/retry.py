@@ -0,0 +1,155 @@
+"""
+Retries with backoff and poison-message isolation for list events.
+
+A consumer never requeues a failed event in place. Instead it acks it and republishes a
+copy, with its attempt count in the `retry-count` header:
+
+- Attempt n goes to `list_updates_retry`, a headers exchange that routes on `retry-delay`
+  to the delay queue `list_updates_delay_{ms}`. The queue's TTL holds the copy for
+  base * 2^(n-1) ms, then dead-letters it back to the shard exchange with its original
+  routing key, so it returns to the same shard queue.
+- After RABBIT_RETRY_MAX_ATTEMPTS, or straight away for undecodable payloads, the copy is
+  parked in `list_updates_dead` through the `list_updates_dlx` exchange, with the error and
+  original routing key in its headers. `python -m bin.dlq` inspects and replays it.
+- Events from a newer schema version are not failures: they are postponed through the
+  longest delay queue, without counting an attempt, until an upgraded worker takes them.
+
+A retried event lands behind later events of its list; clients converge on the next
+event, as with any redelivery.
+"""
+import logging
+import time
+
+import aio_pika
+
+from src.todolist.config import RABBIT_RETRY_MAX_ATTEMPTS, RABBIT_RETRY_BASE_MS
+from src.todolist.services.rabbitmq.shards import EXCHANGE_NAME
+
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+RETRY_EXCHANGE = "list_updates_retry"
+DEAD_EXCHANGE = "list_updates_dlx"
+DEAD_QUEUE = "list_updates_dead"
+
+# headers exchanges ignore "x-" headers when matching, so these stay unprefixed
+RETRY_COUNT_HEADER = "retry-count"
+RETRY_DELAY_HEADER = "retry-delay"
+ERROR_HEADER = "dead-letter-error"
+ROUTING_KEY_HEADER = "original-routing-key"
+FAILED_AT_HEADER = "failed-at"
+
+
+def retry_delays(max_attempts: int = RABBIT_RETRY_MAX_ATTEMPTS, base_ms: int = RABBIT_RETRY_BASE_MS) -> List[int]:
+    """Delay (ms) before each retry attempt: base, 2*base, 4*base, ..."""
+    return [base_ms * 2 ** i for i in range(max_attempts)]
+
+
+def delay_queue_name(delay_ms: int) -> str:
+    return f"list_updates_delay_{delay_ms}"
+
+
+def retry_count(message: aio_pika.abc.AbstractIncomingMessage) -> int:
+    try:
+        return int((message.headers or {}).get(RETRY_COUNT_HEADER, 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+async def declare_retry_topology(
+    channel: aio_pika.abc.AbstractChannel,
+    exchange_name: str = EXCHANGE_NAME,
+    delays: Optional[List[int]] = None,
+):
+    """Declare the retry exchange with one delay queue per backoff step, and the dead-letter queue."""
+    retry_exchange = await channel.declare_exchange(RETRY_EXCHANGE, aio_pika.ExchangeType.HEADERS, durable=True)
+    for delay_ms in delays if delays is not None else retry_delays():
+        queue = await channel.declare_queue(
+            delay_queue_name(delay_ms),
+            durable=True,
+            arguments={
+                "x-message-ttl": delay_ms,
+                # no dead-letter routing key: the message keeps its shard routing key
+                "x-dead-letter-exchange": exchange_name,
+            },
+        )
+        await queue.bind(retry_exchange, arguments={"x-match": "all", RETRY_DELAY_HEADER: str(delay_ms)})
+
+    dead_exchange = await channel.declare_exchange(DEAD_EXCHANGE, aio_pika.ExchangeType.FANOUT, durable=True)
+    dead_queue = await channel.declare_queue(DEAD_QUEUE, durable=True)
+    await dead_queue.bind(dead_exchange)
+    return retry_exchange, dead_exchange
+
+
+class RetryPolicy:
+    """
+    Moves failed events off their shard queue.
+    - failed() schedules the next delayed retry, or dead-letters once attempts run out.
+    - postpone() schedules a redelivery after the longest delay without counting an attempt.
+    - All publish on a confirming channel; True means the copy is safe and the original
+      can be acked, False means it could not be moved and must be requeued.
+    """
+
+    def __init__(self, max_attempts: int = RABBIT_RETRY_MAX_ATTEMPTS, base_ms: int = RABBIT_RETRY_BASE_MS):
+        self.delays = retry_delays(max_attempts, base_ms)
+        self.retry_exchange: Optional[aio_pika.abc.AbstractExchange] = None
+        self.dead_exchange: Optional[aio_pika.abc.AbstractExchange] = None
+
+    async def setup(self, channel: aio_pika.abc.AbstractChannel, exchange_name: str = EXCHANGE_NAME):
+        """`channel` should have publisher confirms on."""
+        self.retry_exchange, self.dead_exchange = await declare_retry_topology(channel, exchange_name, self.delays)
+
+    def _copy(self, message: aio_pika.abc.AbstractIncomingMessage, headers: Dict[str, Any]) -> aio_pika.Message:
+        return aio_pika.Message(
+            body=message.body,
+            content_type=message.content_type,
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            headers={**(message.headers or {}), **headers},
+        )
+
+    async def failed(self, message: aio_pika.abc.AbstractIncomingMessage, error: str | None = None) -> bool:
+        attempt = retry_count(message) + 1
+        if attempt > len(self.delays):
+            return await self.dead_letter(message, f"gave up after {attempt - 1} retries: {error}")
+
+        delay_ms = self.delays[attempt - 1]
+        try:
+            await self.retry_exchange.publish(
+                self._copy(message, {RETRY_COUNT_HEADER: attempt, RETRY_DELAY_HEADER: str(delay_ms)}),
+                routing_key=message.routing_key or "",
+            )
+        except Exception as e:
+            logger.error(f"[worker] Could not schedule retry {attempt}: {e}")
+            return False
+        logger.info(f"[worker] Event failed ({error}), retry {attempt} in {delay_ms}ms")
+        return True
+
+    async def postpone(self, message: aio_pika.abc.AbstractIncomingMessage, reason: str) -> bool:
+        delay_ms = self.delays[-1]
+        try:
+            await self.retry_exchange.publish(
+                self._copy(message, {RETRY_DELAY_HEADER: str(delay_ms)}),
+                routing_key=message.routing_key or "",
+            )
+        except Exception as e:
+            logger.error(f"[worker] Could not postpone event: {e}")
+            return False
+        logger.info(f"[worker] Event postponed ({reason}), redelivery in {delay_ms}ms")
+        return True
+
+    async def dead_letter(self, message: aio_pika.abc.AbstractIncomingMessage, reason: str) -> bool:
+        try:
+            await self.dead_exchange.publish(
+                self._copy(message, {
+                    ERROR_HEADER: reason[:500],
+                    ROUTING_KEY_HEADER: message.routing_key or "",
+                    FAILED_AT_HEADER: int(time.time()),
+                }),
+                routing_key="",
+            )
+        except Exception as e:
+            logger.error(f"[worker] Could not dead-letter event: {e}")
+            return False
+        logger.error(f"[worker] Dead-lettered event: {reason}")
+        return True
@@ -0,0 +1,100 @@
+"""
+Sharding of list events over RabbitMQ queues.
+
+Every event for a list goes to one shard queue, `list_updates_shard_{i}`, so a single
+consumer sees that list's events in publish order. Lists are mapped to shards with
+jump consistent hashing.
+
+Changing RABBIT_NUM_SHARDS from N to M moves only about |M - N| / max(M, N) of the lists.
+1. Start consumers for the new shards first. Publishers declare every queue on
+   connect, so new shard queues exist before anything routes to them.
+2. Roll the new RABBIT_NUM_SHARDS out to publishers. Until all of them have it,
+   events for a moved list can sit in both its old and new queue, and may be
+   delivered out of order. Clients converge on the next event or resync.
+3. When shrinking, keep consumers for the removed shards running until their queues
+   are empty, then delete those queues.
+
+Each shard also has a control queue, `list_updates_control_{i}`, for access-control events
+(membership changes, list deletion). Consumers read it on its own channel and lanes, so a
+revocation never waits behind a burst of task edits.
+"""
+import hashlib
+
+import aio_pika
+
+from typing import List
+
+EXCHANGE_NAME = "list_updates_sharded"
+
+
+def _jump_hash(key: int, num_buckets: int) -> int:
+    """Lamping & Veach jump consistent hash of a 64-bit key into [0, num_buckets)."""
+    b, j = -1, 0
+    while j < num_buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return b
+
+
+def shard_for_list(list_id: int, num_shards: int) -> int:
+    """Stable shard of a list, the same in every process."""
+    key = int.from_bytes(hashlib.blake2b(str(list_id).encode(), digest_size=8).digest(), "big")
+    return _jump_hash(key, num_shards)
+
+
+def shard_routing_key(shard_idx: int) -> str:
+    return f"shard.{shard_idx}"
+
+
+def shard_queue_name(shard_idx: int) -> str:
+    return f"list_updates_shard_{shard_idx}"
+
+
+def control_routing_key(shard_idx: int) -> str:
+    return f"control.{shard_idx}"
+
+
+def control_queue_name(shard_idx: int) -> str:
+    return f"list_updates_control_{shard_idx}"
+
+
+def parse_shards(spec: str, num_shards: int) -> List[int]:
+    """Shards named by "0,2", "1-3" or a mix; empty means all of them."""
+    if not spec.strip():
+        return list(range(num_shards))
+
+    shards = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = (int(x) for x in part.split("-", 1))
+            shards.update(range(start, end + 1))
+        else:
+            shards.add(int(part))
+
+    invalid = [s for s in shards if not 0 <= s < num_shards]
+    if invalid:
+        raise ValueError(f"Shards {sorted(invalid)} out of range for {num_shards} shards")
+    return sorted(shards)
+
+
+async def declare_shards(
+    channel: aio_pika.abc.AbstractChannel,
+    num_shards: int,
+    exchange_name: str = EXCHANGE_NAME,
+) -> aio_pika.abc.AbstractExchange:
+    """
+    Declare the exchange and every shard and control queue with its binding.
+    A direct exchange drops messages with no bound queue, so publishers declare
+    them all rather than relying on consumers having started.
+    """
+    exchange = await channel.declare_exchange(exchange_name, aio_pika.ExchangeType.DIRECT, durable=True)
+    for shard_idx in range(num_shards):
+        queue = await channel.declare_queue(shard_queue_name(shard_idx), durable=True)
+        await queue.bind(exchange, shard_routing_key(shard_idx))
+        control = await channel.declare_queue(control_queue_name(shard_idx), durable=True)
+        await control.bind(exchange, control_routing_key(shard_idx))
+    return exchange
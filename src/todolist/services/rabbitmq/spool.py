@@ -0,0 +1,183 @@
+"""
+Disk spool for list events while RabbitMQ is unreachable.
+
+An append-only log split into segment files, `{seq:012d}.seg`. Each record is
+length (4 bytes) + crc32 (4 bytes) + msgpack [routing_key, content_type, published_at_ms, body].
+Records are replayed oldest first; a segment is deleted once every record in it has been
+confirmed by the broker. The read position is not persisted, so after a crash the oldest
+segment is replayed from its start: delivery stays at-least-once. A torn record at the
+end of a segment (a crash mid-write) ends that segment.
+
+Each process claims its own slot directory under RABBIT_SPOOL_DIR with an flock, so
+workers on one host never share files and a restarted worker picks up its slot's backlog.
+"""
+import fcntl
+import logging
+import os
+import struct
+import zlib
+
+import msgpack
+
+from src.todolist.config import (
+    RABBIT_SPOOL_DIR,
+    RABBIT_SPOOL_SEGMENT_BYTES,
+    RABBIT_SPOOL_MAX_BYTES,
+    RABBIT_SPOOL_FSYNC
+)
+from src.todolist.metrics import RABBIT_SPOOL_BYTES, RABBIT_SPOOL_SEGMENTS
+
+from typing import BinaryIO, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct(">II")  # payload length, crc32
+SEGMENT_SUFFIX = ".seg"
+MAX_SLOTS = 64
+
+SpoolRecord = Tuple[str, str, int, bytes]  # routing_key, content_type, published_at_ms, body
+
+
+def _encode(record: SpoolRecord) -> bytes:
+    payload = msgpack.packb(list(record), use_bin_type=True)
+    return HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+class SegmentSpool:
+    """
+    Ordered, size-capped event log on local disk.
+    - append() writes to the newest segment, rotating at `segment_bytes`; it refuses
+      records once the spool holds `max_bytes`.
+    - read() returns records after the read position together with the position after
+      them; commit() moves the read position there and deletes finished segments.
+    """
+
+    def __init__(
+        self,
+        directory: str = RABBIT_SPOOL_DIR,
+        segment_bytes: int = RABBIT_SPOOL_SEGMENT_BYTES,
+        max_bytes: int = RABBIT_SPOOL_MAX_BYTES,
+        fsync: bool = RABBIT_SPOOL_FSYNC,
+    ):
+        self.base_directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+
+        self.directory: Optional[str] = None
+        self.size = 0  # bytes on disk
+        self._segments: List[int] = []  # sequence numbers, oldest first
+        self._writer: Optional[BinaryIO] = None
+        self._read_offset = 0  # within the oldest segment
+        self._lock: Optional[BinaryIO] = None
+
+    def open(self):
+        """Claim a slot directory and pick up any backlog left in it."""
+        if self.directory is not None:
+            return
+        os.makedirs(self.base_directory, exist_ok=True)
+        for slot in range(MAX_SLOTS):
+            directory = os.path.join(self.base_directory, f"slot-{slot}")
+            os.makedirs(directory, exist_ok=True)
+            lock = open(os.path.join(directory, "lock"), "wb")
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock.close()
+                continue
+            self._lock, self.directory = lock, directory
+            break
+        else:
+            raise RuntimeError(f"All {MAX_SLOTS} spool slots under {self.base_directory} are in use")
+
+        self._segments = sorted(
+            int(name[: -len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+        self.size = sum(os.path.getsize(self._path(seq)) for seq in self._segments)
+        self._update_metrics()
+        if self._segments:
+            logger.info(f"[spool] Found {self.size} bytes in {len(self._segments)} segments in {self.directory}")
+
+    def close(self):
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+        if self._lock:
+            self._lock.close()
+            self._lock = None
+        self.directory = None
+
+    @property
+    def empty(self) -> bool:
+        return not self._segments
+
+    def _path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"{seq:012d}{SEGMENT_SUFFIX}")
+
+    def _update_metrics(self):
+        RABBIT_SPOOL_BYTES.set(self.size)
+        RABBIT_SPOOL_SEGMENTS.set(len(self._segments))
+
+    def append(self, record: SpoolRecord) -> bool:
+        """Write one record at the end of the log; False if the spool is full."""
+        data = _encode(record)
+        if self.size + len(data) > self.max_bytes:
+            return False
+
+        if self._writer is None or self._writer.tell() >= self.segment_bytes:
+            if self._writer is not None:
+                self._writer.close()
+            seq = self._segments[-1] + 1 if self._segments else 0
+            self._segments.append(seq)
+            self._writer = open(self._path(seq), "ab")
+
+        self._writer.write(data)
+        self._writer.flush()
+        if self.fsync:
+            os.fsync(self._writer.fileno())
+        self.size += len(data)
+        self._update_metrics()
+        return True
+
+    def read(self, limit: int) -> Tuple[List[SpoolRecord], int]:
+        """Up to `limit` records from the oldest segment after the read position, and the offset after them."""
+        if not self._segments:
+            return [], 0
+
+        records = []
+        offset = self._read_offset
+        with open(self._path(self._segments[0]), "rb") as segment:
+            segment.seek(offset)
+            while len(records) < limit:
+                header = segment.read(HEADER.size)
+                if not header:
+                    break
+                length, crc = HEADER.unpack(header) if len(header) == HEADER.size else (0, None)
+                payload = segment.read(length)
+                if crc is None or len(payload) < length or zlib.crc32(payload) != crc:
+                    logger.error(f"[spool] Torn record in segment {self._segments[0]} at {offset}, skipping the rest")
+                    offset = os.path.getsize(self._path(self._segments[0]))
+                    break
+                records.append(tuple(msgpack.unpackb(payload, raw=False)))
+                offset = segment.tell()
+        return records, offset
+
+    def commit(self, offset: int):
+        """Everything before `offset` in the oldest segment is confirmed; drop finished segments."""
+        self._read_offset = offset
+        while self._segments:
+            path = self._path(self._segments[0])
+            if self._read_offset < os.path.getsize(path):
+                return
+            writing = len(self._segments) == 1 and self._writer is not None
+            if writing:
+                # caught up with the writer: start the next record in a fresh segment
+                self._writer.close()
+                self._writer = None
+            self.size -= os.path.getsize(path)
+            os.remove(path)
+            self._segments.pop(0)
+            self._read_offset = 0
+            self._update_metrics()
@@ -0,0 +1,276 @@
+import logging
+import math
+import time
+from collections import OrderedDict
+
+import redis.asyncio as redis
+from fastapi import Request, status
+from fastapi.responses import JSONResponse
+from fastapi.security.utils import get_authorization_scheme_param
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.responses import Response
+
+from src.todolist.auth.token_cache import decode_token
+from src.todolist.config import (
+    REDIS_HOST,
+    REDIS_PORT,
+    REDIS_URL,
+    RATE_LIMIT_ENABLED,
+    RATE_LIMIT_AUTH_PER_MIN,
+    RATE_LIMIT_WRITE_PER_MIN,
+    RATE_LIMIT_AI_PER_MIN,
+    RATE_LIMIT_LOCAL_HEADROOM,
+    RATE_LIMIT_LOCAL_SYNC_MS
+)
+
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Atomic token bucket.
+# KEYS[1] bucket hash; ARGV: capacity, refill per ms, now (ms), debt, cost.
+# `debt` is what this node already admitted locally since its last sync;
+# it is always charged, `cost` only when enough tokens remain.
+TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local debt = tonumber(ARGV[4])
+local cost = tonumber(ARGV[5])
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil then
+    tokens = capacity
+    ts = now
+end
+
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate) - debt
+
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+
+redis.call('HMSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate))
+return {allowed, tostring(tokens)}
+"""
+
+LOCAL_STATE_MAX_KEYS = 10000
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+AUTH_PATHS = ("/auth/login", "/auth/register", "/auth/forgot-password", "/auth/reset-password", "/auth/verify_email")
+
+
+class RateLimitRule:
+    """A named token bucket: `capacity` burst, refilled at `per_minute` tokens a minute."""
+
+    def __init__(self, name: str, per_minute: int, capacity: int | None = None):
+        self.name = name
+        self.capacity = capacity or per_minute
+        self.refill_per_ms = per_minute / 60000
+
+    def seconds_until(self, tokens: float, target: float) -> int:
+        """Seconds until the bucket refills from `tokens` to `target`."""
+        if tokens >= target:
+            return 0
+        return math.ceil((target - tokens) / self.refill_per_ms / 1000)
+
+
+class RateLimitResult:
+    """Outcome of a bucket check, rendered as RateLimit-* headers."""
+
+    def __init__(self, rule: RateLimitRule, allowed: bool, remaining: float):
+        self.rule = rule
+        self.allowed = allowed
+        self.remaining = remaining
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "RateLimit-Limit": str(self.rule.capacity),
+            "RateLimit-Remaining": str(max(0, math.floor(self.remaining))),
+            "RateLimit-Reset": str(self.rule.seconds_until(self.remaining, self.rule.capacity)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, self.rule.seconds_until(self.remaining, 1)))
+        return headers
+
+
+class _LocalBucket:
+    """Last known Redis state for a key, plus admissions not yet reported."""
+
+    __slots__ = ("tokens", "synced_at", "debt")
+
+    def __init__(self, tokens: float, synced_at: float):
+        self.tokens = tokens
+        self.synced_at = synced_at
+        self.debt = 0
+
+
+class RedisRateLimiter:
+    """
+    Token bucket rate limiter backed by an atomic Redis Lua script.
+    - One EVALSHA round-trip per check.
+    - Callers that were comfortably under their limit at the last sync are
+      admitted locally; their admissions are charged on the next sync.
+    - Fails open if Redis is unavailable.
+    """
+
+    def __init__(
+        self,
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        local_headroom: float = RATE_LIMIT_LOCAL_HEADROOM,
+        local_sync_ms: int = RATE_LIMIT_LOCAL_SYNC_MS,
+    ):
+        self.redis_host = host
+        self.redis_port = port
+        self.redis: redis.Redis | None = None
+        self._script = None
+        self.local_headroom = local_headroom
+        self.local_sync_ms = local_sync_ms
+        self._local: "OrderedDict[str, _LocalBucket]" = OrderedDict()
+
+    def _get_redis_connection(self) -> redis.Redis:
+        """Establish or return the Redis connection."""
+        if not self.redis:
+            if REDIS_URL:
+                self.redis = redis.from_url(REDIS_URL, decode_responses=True)
+            else:
+                self.redis = redis.Redis(
+                    host=self.redis_host,
+                    port=self.redis_port,
+                    decode_responses=True
+                )
+            self._script = self.redis.register_script(TOKEN_BUCKET_LUA)
+        return self.redis
+
+    def _local_check(self, key: str, rule: RateLimitRule, now_ms: float) -> Optional[RateLimitResult]:
+        """Admit without Redis if the last synced state leaves plenty of headroom."""
+        bucket = self._local.get(key)
+        if bucket is None or now_ms - bucket.synced_at > self.local_sync_ms:
+            return None
+
+        remaining = bucket.tokens - bucket.debt - 1
+        if remaining < rule.capacity * self.local_headroom:
+            return None
+
+        bucket.debt += 1
+        return RateLimitResult(rule, True, remaining)
+
+    def _remember(self, key: str, tokens: float, now_ms: float):
+        """Store synced state, keeping the debt admitted locally while the sync was in flight."""
+        current = self._local.get(key)
+        if current is not None and current.synced_at > now_ms:
+            return  # a later sync finished first
+        bucket = _LocalBucket(tokens, now_ms)
+        bucket.debt = current.debt if current is not None else 0
+        self._local[key] = bucket
+        self._local.move_to_end(key)
+        while len(self._local) > LOCAL_STATE_MAX_KEYS:
+            self._local.popitem(last=False)
+
+    async def hit(self, rule: RateLimitRule, identity: str, cost: int = 1) -> RateLimitResult:
+        """Consume `cost` tokens from `identity`'s bucket for `rule`."""
+        key = f"rl:{rule.name}:{identity}"
+        now_ms = time.time() * 1000
+
+        local = self._local_check(key, rule, now_ms)
+        if local:
+            return local
+
+        # the debt is in flight from here on; local admissions during the await accrue anew
+        bucket = self._local.get(key)
+        debt = 0
+        if bucket:
+            debt, bucket.debt = bucket.debt, 0
+
+        try:
+            self._get_redis_connection()
+            allowed, tokens = await self._script(
+                keys=[key],
+                args=[rule.capacity, rule.refill_per_ms, int(now_ms), debt, cost],
+            )
+        except Exception as e:
+            current = self._local.get(key)
+            if current is not None:
+                current.debt += debt  # charged on the next sync
+            logger.warning(f"Rate limiter unavailable, allowing request: {e}")
+            return RateLimitResult(rule, True, rule.capacity)
+
+        tokens = float(tokens)
+        self._remember(key, tokens, now_ms)
+        return RateLimitResult(rule, bool(allowed), tokens)
+
+
+AUTH_RULE = RateLimitRule("auth", RATE_LIMIT_AUTH_PER_MIN)
+WRITE_RULE = RateLimitRule("write", RATE_LIMIT_WRITE_PER_MIN)
+AI_RULE = RateLimitRule("ai", RATE_LIMIT_AI_PER_MIN)
+
+rate_limiter = RedisRateLimiter()
+
+
+def _route_path(request: Request) -> str:
+    """Request path relative to the app it is mounted on."""
+    path = request.url.path
+    root_path = request.scope.get("root_path", "")
+    if root_path and path.startswith(root_path):
+        return path[len(root_path):]
+    return path
+
+
+def _user_identity(request: Request) -> Optional[str]:
+    """User id from a valid bearer token, verified through the token cache (no DB)."""
+    scheme, token = get_authorization_scheme_param(request.headers.get("Authorization"))
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return decode_token(token).get("sub")
+    except Exception:
+        return None
+
+
+def resolve_rule(request: Request) -> Tuple[Optional[RateLimitRule], Optional[str]]:
+    """Pick the bucket and the identity it is keyed by for a request."""
+    path = _route_path(request)
+    client_ip = request.client.host if request.client else "unknown"
+
+    if request.method == "POST" and path.startswith(AUTH_PATHS):
+        return AUTH_RULE, f"ip:{client_ip}"
+
+    if path.startswith("/ai/"):
+        rule = AI_RULE
+    elif request.method in WRITE_METHODS:
+        rule = WRITE_RULE
+    else:
+        return None, None
+
+    user_id = _user_identity(request)
+    return rule, f"user:{user_id}" if user_id else f"ip:{client_ip}"
+
+
+class RateLimitMiddleware(BaseHTTPMiddleware):
+    """Applies per-route, per-user token buckets and sets RateLimit-* headers."""
+
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+        if not RATE_LIMIT_ENABLED:
+            return await call_next(request)
+
+        rule, identity = resolve_rule(request)
+        if not rule:
+            return await call_next(request)
+
+        result = await rate_limiter.hit(rule, identity)
+        if not result.allowed:
+            logger.info(f"Rate limited {identity} on '{rule.name}'")
+            return JSONResponse(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                content={"detail": [{"msg": "Too many requests. Please slow down."}]},
+                headers=result.headers(),
+            )
+
+        response = await call_next(request)
+        response.headers.update(result.headers())
+        return response
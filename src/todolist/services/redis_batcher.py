@@ -0,0 +1,91 @@
+import asyncio
+import logging
+
+from src.todolist.config import REDIS_PUBLISH_BATCH_SIZE, REDIS_PUBLISH_WINDOW_MS
+from src.todolist.services.redis_manager import RedisPubSubManager
+
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class RedisPublishBatcher:
+    """
+    Micro-batches room publishes into one Redis pipeline.
+    - submit() returns a future resolved once the pipeline carrying the message succeeds,
+      with what publish_many() reported for it (None for backends that report nothing).
+    - A batch is flushed when it reaches `max_batch` messages or `window_ms` after it started.
+    - Batches go out one at a time in submit order, so per-room order is kept.
+    """
+
+    def __init__(
+        self,
+        pubsub: RedisPubSubManager,
+        max_batch: int = REDIS_PUBLISH_BATCH_SIZE,
+        window_ms: int = REDIS_PUBLISH_WINDOW_MS,
+    ):
+        self.pubsub = pubsub
+        self.max_batch = max(1, max_batch)
+        self.window = window_ms / 1000
+        self._pending: List[Tuple[str, str, Optional[str], asyncio.Future]] = []
+        self._wakeup = asyncio.Event()
+        self._full = asyncio.Event()
+        self._flushing = False
+        self._task: asyncio.Task | None = None
+
+    def submit(self, room_id: str, message: str, guard: Optional[str] = None) -> asyncio.Future:
+        """Queue a publish, skipped in Redis if `guard` has no live member; never blocks."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((room_id, message, guard, future))
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        self._wakeup.set()
+
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+        return future
+
+    async def _flush_loop(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            if len(self._pending) < self.max_batch and self.window > 0:
+                try:
+                    await asyncio.wait_for(self._full.wait(), timeout=self.window)
+                except asyncio.TimeoutError:
+                    pass
+            self._full.clear()
+
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            if self._pending:
+                self._wakeup.set()
+            if not batch:
+                continue
+
+            self._flushing = True
+            messages = [(room_id, message) for room_id, message, _, _ in batch]
+            guards = [guard for _, _, guard, _ in batch]
+            try:
+                if any(guards):
+                    results = await self.pubsub.publish_many(messages, guards)
+                else:
+                    results = await self.pubsub.publish_many(messages)
+            except Exception as e:
+                logger.error(f"Redis pipeline of {len(batch)} publishes failed: {e}")
+                for _, _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for i, (_, _, _, future) in enumerate(batch):
+                    if not future.done():
+                        future.set_result(results[i] if results else None)
+            finally:
+                self._flushing = False
+
+    async def drain(self, timeout: float):
+        """Wait (up to `timeout` seconds) until everything submitted has been flushed."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while (self._pending or self._flushing) and loop.time() < deadline:
+            await asyncio.sleep(0.01)
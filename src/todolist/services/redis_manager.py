@@ -1,12 +1,13 @@
 import asyncio
 import logging
 import json
+import time
 
 from src.todolist.config import REDIS_HOST, REDIS_PORT, REDIS_URL
 import redis.asyncio as redis
 
 from fastapi import WebSocket
-from typing import Callable, Dict, Set, List
+from typing import Callable, Dict, Set, List, Optional, Tuple
 
 
 logging.basicConfig(
@@ -15,17 +16,40 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# KEYS[1] = sorted set scored by expiry (ms), KEYS[2] = channel; ARGV = now_ms, message
+# Publishes only while the set has a live member; returns the receiver count, or -1 if skipped.
+PUBLISH_IF_LIVE_LUA = """
+if redis.call('ZCOUNT', KEYS[1], ARGV[1], '+inf') == 0 then
+    return -1
+end
+return redis.call('PUBLISH', KEYS[2], ARGV[2])
+"""
+NOT_PUBLISHED = -1
+
 
 class RedisPubSubManager:
-    """Redis Pub/Sub manager for multiple rooms/users."""
+    """
+    Redis Pub/Sub manager for multiple rooms/users.
+    - One shared pubsub connection per process, whatever the number of rooms.
+    - Subscribe/unsubscribe requests are batched onto that connection.
+    - A single dispatch loop routes messages to room callbacks by channel.
+    """
 
     def __init__(self, host=REDIS_HOST, port=REDIS_PORT):
         self.redis_host = host
         self.redis_port = port
         self.redis: redis.Redis | None = None
-        self.room_listeners: Dict[str, asyncio.Task] = {}  # room_id -> listener task
         self.room_callbacks: Dict[str, Set[Callable]] = {}  # room_id -> set of async callbacks
 
+        self._pubsub = None
+        self._pending_subscribe: Set[str] = set()
+        self._pending_unsubscribe: Set[str] = set()
+        self._commands_pending = asyncio.Event()
+        self._has_subscriptions = asyncio.Event()
+        self._command_task: asyncio.Task | None = None
+        self._dispatch_task: asyncio.Task | None = None
+        self._publish_if_live = None
+
 
     async def _get_redis_connection(self) -> redis.Redis:
         """Establish or return the Redis connection."""
@@ -51,59 +75,126 @@ class RedisPubSubManager:
         if not self.redis:
             await self.connect()
         await self.redis.publish(room_id, message)
-        logger.info(f"Published message to {room_id}: {message}")
+        logger.debug(f"Published message to {room_id}")
+
+    async def publish_many(
+        self,
+        messages: List[Tuple[str, str]],
+        guards: Optional[List[Optional[str]]] = None,
+    ) -> List[int]:
+        """
+        Publish (room_id, message) pairs in order, in one pipelined round-trip.
+        A message with a guard (a sorted set scored by expiry) is only published while the
+        guard has a live member, checked by Redis in the same pipeline.
+        Returns each message's receiver count, NOT_PUBLISHED for skipped ones.
+        """
+        if not self.redis:
+            await self.connect()
+        if guards and self._publish_if_live is None:
+            self._publish_if_live = self.redis.register_script(PUBLISH_IF_LIVE_LUA)
+        now = int(time.time() * 1000)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for i, (room_id, message) in enumerate(messages):
+                guard = guards[i] if guards else None
+                if guard:
+                    await self._publish_if_live(keys=[guard, room_id], args=[now, message], client=pipe)
+                else:
+                    pipe.publish(room_id, message)
+            return await pipe.execute()
+
+    async def _ensure_listener(self):
+        """Create the shared pubsub connection and its tasks on first use."""
+        if self._pubsub is None:
+            redis_conn = await self._get_redis_connection()
+            self._pubsub = redis_conn.pubsub()
+        if not self._command_task or self._command_task.done():
+            self._command_task = asyncio.create_task(self._command_loop())
+        if not self._dispatch_task or self._dispatch_task.done():
+            self._dispatch_task = asyncio.create_task(self._dispatch_loop())
+            logger.info("Started shared Redis pubsub listener")
 
     async def subscribe(self, room_id: str, callback: Callable[[str], None]):
         """
         Subscribe a callback to a room.
-        Starts a listener task if not already running.
+        The channel is subscribed on the shared connection if it is new.
         """
         if room_id not in self.room_callbacks:
             self.room_callbacks[room_id] = set()
+            self._pending_unsubscribe.discard(room_id)
+            self._pending_subscribe.add(room_id)
+            self._commands_pending.set()
         self.room_callbacks[room_id].add(callback)
         logger.info(f"Subscribed new callback to room {room_id}")
 
-        # Start listener task for room if it doesn't exist
-        if room_id not in self.room_listeners:
-            self.room_listeners[room_id] = asyncio.create_task(self._room_listener(room_id))
-            logger.info(f"Started Redis listener task for room {room_id}")
+        await self._ensure_listener()
 
     async def unsubscribe(self, room_id: str, callback: Callable[[str], None]):
-        """Unsubscribe a callback from a room. Stop listener if no callbacks remain."""
+        """Unsubscribe a callback from a room. Drop the channel if no callbacks remain."""
         if room_id in self.room_callbacks:
             self.room_callbacks[room_id].discard(callback)
             if not self.room_callbacks[room_id]:
-                # Cancel listener task
-                task = self.room_listeners.pop(room_id, None)
-                if task:
-                    task.cancel()
-                    logger.info(f"Canceled listener task for room {room_id}")
                 self.room_callbacks.pop(room_id, None)
+                self._pending_subscribe.discard(room_id)
+                self._pending_unsubscribe.add(room_id)
+                self._commands_pending.set()
                 logger.info(f"Unsubscribed all callbacks from room {room_id}")
 
-    async def _room_listener(self, room_id: str):
-        """Internal async listener task for a room."""
-        logger.info(f"Room listener coroutine STARTED for {room_id}")
-        redis_conn = await self._get_redis_connection()
-
-        try:
-            pubsub = redis_conn.pubsub()
-            await pubsub.subscribe(room_id)
-            logger.info(f"Listener subscribed to Redis channel {room_id}")
-        except Exception as e:
-            logger.error(f"Failed to subscribe to {room_id}: {e}")
-            return
-
-        try:
-            async for message in pubsub.listen():
-                if message['type'] == 'message':
-                    # Send message to all callbacks registered for this room
-                    for callback in self.room_callbacks.get(room_id, set()):
-                        await callback(message['data'])
-        except asyncio.CancelledError:
-            # Gracefully unsubscribe when task is canceled
-            await pubsub.unsubscribe(room_id)
-            logger.info(f"Listener for {room_id} cancelled and unsubscribed")
-        finally:
-            await pubsub.close()
-            logger.info(f"Listener for {room_id} closed")
+    async def _command_loop(self):
+        """Flush pending (un)subscribe requests in batches, one command each way."""
+        while True:
+            await self._commands_pending.wait()
+            # let other coroutines in this tick add to the batch
+            await asyncio.sleep(0)
+            self._commands_pending.clear()
+
+            subscribe, self._pending_subscribe = self._pending_subscribe, set()
+            unsubscribe, self._pending_unsubscribe = self._pending_unsubscribe, set()
+            try:
+                if subscribe:
+                    await self._pubsub.subscribe(*subscribe)
+                    self._has_subscriptions.set()
+                    logger.info(f"Subscribed to {len(subscribe)} Redis channels")
+                if unsubscribe:
+                    await self._pubsub.unsubscribe(*unsubscribe)
+                    logger.info(f"Unsubscribed from {len(unsubscribe)} Redis channels")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to update Redis subscriptions: {e}")
+                # retry the batch, dropping anything superseded in the meantime
+                self._pending_subscribe |= {r for r in subscribe if r in self.room_callbacks}
+                self._pending_unsubscribe |= {r for r in unsubscribe if r not in self.room_callbacks}
+                self._commands_pending.set()
+                await asyncio.sleep(1)
+
+    async def _dispatch_loop(self):
+        """Read from the shared pubsub connection and route messages by channel."""
+        await self._has_subscriptions.wait()
+        while self._pubsub is not None:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Redis pubsub read failed: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            if not message or message["type"] != "message":
+                continue
+
+            for callback in list(self.room_callbacks.get(message["channel"], ())):
+                try:
+                    await callback(message["data"])
+                except Exception as e:
+                    logger.error(f"Room callback failed for {message['channel']}: {e}")
+
+    async def close(self):
+        """Stop the listener tasks and close the shared pubsub connection."""
+        for task in (self._command_task, self._dispatch_task):
+            if task:
+                task.cancel()
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        logger.info("Redis pubsub listener closed")
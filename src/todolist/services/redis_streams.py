@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import uuid
+
+from src.todolist.config import (
+    REDIS_HOST,
+    REDIS_PORT,
+    WS_STREAM_MAXLEN,
+    WS_STREAM_BLOCK_MS
+)
+from src.todolist.services.redis_manager import RedisPubSubManager
+
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+READ_COUNT = 1000
+WAKEUP_TTL = 86400  # seconds; the wakeup stream of a process that died is cleaned up
+
+
+def with_event_id(message: str, event_id: str) -> str:
+    """Splice the stream id into an encoded JSON object without re-encoding it."""
+    if message.startswith("{") and message != "{}":
+        return f'{{"event_id":"{event_id}",{message[1:]}'
+    return message
+
+
+def stream_id_key(event_id: str) -> Tuple[int, int]:
+    """Sortable form of a Redis stream id ("<ms>-<seq>")."""
+    ms, _, seq = event_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+class RedisStreamManager(RedisPubSubManager):
+    """
+    Redis Streams fan-out with the same room interface as RedisPubSubManager.
+    - publish() is an XADD capped at `maxlen` entries per room.
+    - One reader task per process serves every subscribed room with a blocking XREAD.
+      The read also watches a private wakeup stream: when rooms change, one XADD there ends
+      the read early and the next one covers the new set. Cancelling the read instead would
+      drop its connection.
+    - Callbacks receive the stream id, so clients can resume with replay().
+    """
+
+    def __init__(self, host=REDIS_HOST, port=REDIS_PORT, maxlen: int = WS_STREAM_MAXLEN, block_ms: int = WS_STREAM_BLOCK_MS):
+        super().__init__(host=host, port=port)
+        self.maxlen = maxlen
+        self.block_ms = block_ms
+        self._cursors: Dict[str, str] = {}  # room_id -> last stream id delivered
+        self._streams_changed = asyncio.Event()
+        self._reader_task: asyncio.Task | None = None
+        self._wakeup_key = f"ws_stream_wakeup:{uuid.uuid4().hex}"
+        self._wakeup_cursor = "0-0"
+        self._wakeup_sent = False  # one wakeup per blocking read is enough
+
+    async def publish(self, room_id: str, message: str):
+        """Append a message to a room's stream."""
+        if not self.redis:
+            await self.connect()
+        await self.redis.xadd(room_id, {"data": message}, maxlen=self.maxlen, approximate=True)
+
+    async def publish_many(self, messages: List[Tuple[str, str]]):
+        """Append (room_id, message) pairs in order, in one pipelined round-trip."""
+        if not self.redis:
+            await self.connect()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for room_id, message in messages:
+                pipe.xadd(room_id, {"data": message}, maxlen=self.maxlen, approximate=True)
+            await pipe.execute()
+
+    async def _tail_id(self, room_id: str) -> str:
+        entries = await self.redis.xrevrange(room_id, count=1)
+        return entries[0][0] if entries else "0-0"
+
+    async def subscribe(self, room_id: str, callback: Callable[[str, Optional[str]], None]):
+        """Subscribe a callback to a room, starting after the stream's current tail."""
+        await self._get_redis_connection()
+        new_room = room_id not in self.room_callbacks
+        if new_room:
+            # read the tail first, so a failure leaves no half-registered room behind
+            cursor = await self._tail_id(room_id)
+            new_room = room_id not in self.room_callbacks
+            if new_room:
+                self.room_callbacks[room_id] = set()
+                self._cursors[room_id] = cursor
+                self._streams_changed.set()
+        self.room_callbacks[room_id].add(callback)
+        logger.info(f"Subscribed new callback to stream {room_id}")
+
+        if not self._reader_task or self._reader_task.done():
+            self._reader_task = asyncio.create_task(self._reader_loop())
+            logger.info("Started shared Redis stream reader")
+        elif new_room:
+            await self._wake_reader()
+
+    async def unsubscribe(self, room_id: str, callback: Callable[[str, Optional[str]], None]):
+        """Unsubscribe a callback; the reader stops polling rooms with no callbacks."""
+        if room_id in self.room_callbacks:
+            self.room_callbacks[room_id].discard(callback)
+            if not self.room_callbacks[room_id]:
+                self.room_callbacks.pop(room_id, None)
+                self._cursors.pop(room_id, None)
+                logger.info(f"Unsubscribed all callbacks from stream {room_id}")
+                await self._wake_reader()
+
+    async def _wake_reader(self):
+        """End the reader's blocking XREAD early, so the next read covers the changed rooms."""
+        if self._wakeup_sent:
+            return
+        self._wakeup_sent = True
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.xadd(self._wakeup_key, {"wake": 1}, maxlen=1)
+                pipe.expire(self._wakeup_key, WAKEUP_TTL)
+                await pipe.execute()
+        except Exception as e:
+            # the read still ends within block_ms and picks up the change then
+            logger.error(f"Failed to wake the Redis stream reader: {e}")
+
+    async def _reader_loop(self):
+        """Blocking XREAD over every subscribed room plus the wakeup stream."""
+        while True:
+            if not self._cursors:
+                await self._streams_changed.wait()
+            self._streams_changed.clear()
+
+            # changes from here on need a fresh wakeup; one that lands before the read is
+            # sent is still seen, as the wakeup cursor is behind it
+            self._wakeup_sent = False
+            streams = {self._wakeup_key: self._wakeup_cursor, **self._cursors}
+            try:
+                result = await self.redis.xread(streams, count=READ_COUNT, block=self.block_ms)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Redis stream read failed: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            for room_id, entries in result or []:
+                if room_id == self._wakeup_key:
+                    self._wakeup_cursor = entries[-1][0]
+                    continue
+                for entry_id, fields in entries:
+                    if room_id not in self._cursors:
+                        break
+                    self._cursors[room_id] = entry_id
+                    for callback in list(self.room_callbacks.get(room_id, ())):
+                        try:
+                            await callback(fields["data"], entry_id)
+                        except Exception as e:
+                            logger.error(f"Room callback failed for {room_id}: {e}")
+
+    async def replay(self, room_id: str, last_event_id: str, limit: int) -> Optional[List[Tuple[str, str]]]:
+        """
+        Entries published after `last_event_id`, oldest first.
+        Returns None if the stream no longer reaches back to it or more than `limit`
+        entries were missed; the client must then reload instead.
+        """
+        if not self.redis:
+            await self.connect()
+        try:
+            entries = await self.redis.xrange(room_id, min=last_event_id, count=limit + 1)
+        except Exception as e:
+            logger.info(f"Cannot replay {room_id} from {last_event_id}: {e}")
+            return None
+
+        if not entries or entries[0][0] != last_event_id or len(entries) > limit:
+            return None
+        return [(entry_id, fields["data"]) for entry_id, fields in entries[1:]]
+
+    async def close(self):
+        """Stop the reader task."""
+        if self._reader_task:
+            self._reader_task.cancel()
+        if self.redis:
+            try:
+                await self.redis.delete(self._wakeup_key)
+            except Exception as e:
+                logger.info(f"Could not delete the stream reader's wakeup key: {e}")
+        logger.info("Redis stream reader closed")
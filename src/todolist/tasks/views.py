@@ -20,7 +20,20 @@ from src.todolist.auth.service import CurrentUser
 from src.todolist.auth.models import TodolistUser
 
 from src.todolist.websocket.manager import ws_manager
-from src.todolist.services.rabbitmq.producer import rabbit_publisher
+from src.todolist.websocket.models import PresenceResponse, WsTokenResponse
+from src.todolist.websocket.utils import create_capability_token
+from src.todolist.services.events.schema import (
+    LIST_DELETED,
+    LIST_UPDATED,
+    MEMBER_ADDED,
+    MEMBER_REMOVED,
+    TASK_ADDED,
+    TASK_DELETED,
+    TASK_UPDATED,
+    make_event
+)
+from src.todolist.services.events.transport import event_transport
+from src.todolist.config import TODOLIST_WS_CAPABILITY_EXP, WS_PRESENCE_LIST_LIMIT
 
 from .models import (
     Todolist,
@@ -119,6 +132,24 @@ def get_completed_tasks(
     return paginate(completed_tasks, **commons)
 
 
+@task_router.get("/{list_id}/ws-token", response_model=WsTokenResponse)
+def get_ws_token(list_id: int, current_user: CurrentUser, permission: ViewPermission):
+    """Issues a short-lived capability token for subscribing to the list over WebSocket."""
+    token = create_capability_token(
+        user_id=current_user.id,
+        list_id=list_id,
+        role=permission.role
+    )
+    return {"token": token, "expires_in": TODOLIST_WS_CAPABILITY_EXP}
+
+
+@task_router.get("/{list_id}/presence", response_model=PresenceResponse)
+async def get_list_presence(list_id: int, permission: ViewPermission):
+    """Returns who is currently viewing the list over WebSocket, on any server."""
+    count, user_ids = await ws_manager.presence.viewers(list_id, WS_PRESENCE_LIST_LIMIT)
+    return {"list_id": list_id, "count": count, "user_ids": user_ids}
+
+
 @user_router.get("/{user_id}/todolists", response_model=TodolistPagination)
 def get_all_todolists(
     db_session: DbSession, 
@@ -183,9 +214,9 @@ async def add_tasks(
     
     task = add_task(db_session=db_session, task_in=task_in, todolist=todolist, current_user=current_user.id)
 
-    await rabbit_publisher.publish_sharded_event(
+    await event_transport.publish(
         list_id=list_id,
-        message={"action": "task_added", "task": task.dict()}
+        event=make_event(TASK_ADDED, task)
     )
 
     return task
@@ -203,9 +234,9 @@ async def update_todolist(db_session: DbSession, todolist_in: TodolistUpdate, li
     
     list_update = update_list(db_session=db_session, todolist=todolist, todolist_in=todolist_in)
 
-    await rabbit_publisher.publish_sharded_event(
+    await event_transport.publish(
         list_id=list_id,
-        message={"action": "list_title_update", "task": list_update.dict()}
+        event=make_event(LIST_UPDATED, list_update)
     )
 
     return list_update
@@ -223,9 +254,9 @@ async def update_todotask(db_session: DbSession, todotask_in: TodotaskUpdate, li
     
     task_update = update_task(db_session=db_session, task=todotask, task_in=todotask_in)
     
-    await rabbit_publisher.publish_sharded_event(
+    await event_transport.publish(
         list_id=list_id,
-        message={"action": "task_updated", "task": task_update.dict()}
+        event=make_event(TASK_UPDATED, task_update)
     )
 
     return task_update
@@ -242,9 +273,11 @@ async def delete_list(db_session: DbSession, list_id: int,  current_user: Curren
         )
     delete_lt(db_session=db_session, list_id=list_id)
 
-    await rabbit_publisher.publish_sharded_event(
+    # capability tokens are checked without the database, so they are revoked explicitly
+    await ws_manager.revocations.record(list_id)
+    await event_transport.publish(
         list_id=list_id,
-        message={"action": "task_added", "task": {"id":list_id}}
+        event=make_event(LIST_DELETED, {"id": list_id})
     )
 
     return {"msg": "Todolist deleted", "id": list_id}
@@ -261,9 +294,9 @@ async def delete_task(db_session: DbSession, list_id: int, task_id: int,  permis
         )
     delete_tk(db_session=db_session, task_id=task_id)
 
-    await rabbit_publisher.publish_sharded_event(
+    await event_transport.publish(
         list_id=list_id,
-        message={"action": "task_added", "task": {"id":task_id}}
+        event=make_event(TASK_DELETED, {"id": task_id})
     )
 
     return {"msg": "Todotask deleted", "id": task_id}
@@ -324,13 +357,10 @@ async def invite_user(
         }
     }
 
-    # RabbitMQ Event
-    await rabbit_publisher.publish_sharded_event(
+    # List event
+    await event_transport.publish(
         list_id=list_id,
-        message={
-            "action": "user_added",
-            "member": member_response
-        }
+        event=make_event(MEMBER_ADDED, member_response)
     )
 
     return {
@@ -363,14 +393,11 @@ async def remove_user(
     db_session.delete(membership)
     db_session.commit()
 
-    await rabbit_publisher.publish_sharded_event(
+    # capability tokens are checked without the database, so they are revoked explicitly
+    await ws_manager.revocations.record(list_id, user_id)
+    await event_transport.publish(
         list_id=list_id,
-        message={
-            "action": "user_removed",
-            "member": {
-                "user_id": user_id
-            }
-        }
+        event=make_event(MEMBER_REMOVED, {"user_id": user_id})
     )
 
     return {
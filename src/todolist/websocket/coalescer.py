@@ -0,0 +1,68 @@
+import asyncio
+import logging
+from collections import OrderedDict
+
+from src.todolist.config import WS_COALESCE_WINDOW_MS
+from src.todolist.websocket.connection import OutboundFrame, coalesce_key
+
+from typing import Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+def batch_frame(list_id: int, frames: list[OutboundFrame]) -> OutboundFrame:
+    """One frame carrying several events, spliced from their encoded text."""
+    event_id = frames[-1].event_id
+    header = f'{{"action":"batch","list_id":{list_id},'
+    if event_id:
+        header += f'"event_id":"{event_id}",'
+    text = header + '"events":[' + ",".join(frame.text for frame in frames) + "]}"
+    return OutboundFrame(text, event_id=event_id, list_id=list_id)
+
+
+class RoomCoalescer:
+    """
+    Buffers a room's events for a short window before fan-out.
+    - A later task_updated for the same task replaces the earlier one.
+    - Whatever is left goes out as a single frame (a batch if more than one).
+    """
+
+    def __init__(self, list_id: int, deliver: Callable[[OutboundFrame], None], window_ms: int = WS_COALESCE_WINDOW_MS):
+        self.list_id = list_id
+        self.deliver = deliver
+        self.window = window_ms / 1000
+        self.superseded = 0
+        self._pending: "OrderedDict[Hashable, OutboundFrame]" = OrderedDict()
+        self._flush_handle: asyncio.TimerHandle | None = None
+
+    def add(self, frame: OutboundFrame):
+        if self.window <= 0:
+            self.deliver(frame)
+            return
+
+        key = coalesce_key(frame)
+        if key is None:
+            key = object()
+        elif self._pending.pop(key, None) is not None:
+            self.superseded += 1
+        # re-inserted at the end: the latest state keeps its place after anything it followed
+        self._pending[key] = frame
+
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.window, self.flush)
+
+    def flush(self):
+        """Deliver everything buffered now."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        frames = list(self._pending.values())
+        self._pending.clear()
+        if not frames:
+            return
+
+        try:
+            self.deliver(frames[0] if len(frames) == 1 else batch_frame(self.list_id, frames))
+        except Exception as e:
+            logger.error(f"Failed to deliver coalesced frames for list {self.list_id}: {e}")
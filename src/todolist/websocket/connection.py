@@ -0,0 +1,254 @@
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+
+import msgpack
+from fastapi import WebSocket, WebSocketDisconnect, status
+
+from src.todolist.config import WS_SEND_QUEUE_SIZE, WS_OVERFLOW_POLICY
+from src.todolist.services.redis_streams import stream_id_key
+
+from typing import Any, Deque, Dict, Hashable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_DROP = "drop"              # discard the oldest queued frame
+OVERFLOW_COALESCE = "coalesce"      # replace a queued frame for the same entity, else drop oldest
+OVERFLOW_DISCONNECT = "disconnect"  # evict the slow consumer
+OVERFLOW_POLICIES = {OVERFLOW_DROP, OVERFLOW_COALESCE, OVERFLOW_DISCONNECT}
+
+# Sec-WebSocket-Protocol values; JSON text frames unless the client offers msgpack
+PROTOCOL_JSON = "todolist.json.v1"
+PROTOCOL_MSGPACK = "todolist.msgpack.v1"
+
+
+class OutboundFrame:
+    """
+    An already-encoded event, shared by every connection in a room.
+    The payload is only parsed if something server-side needs to look inside it,
+    and packed to msgpack once, on first use by a msgpack client.
+    """
+
+    __slots__ = ("text", "event_id", "list_id", "_event", "_binary")
+
+    def __init__(
+        self,
+        text: str,
+        event: Optional[Dict[str, Any]] = None,
+        event_id: Optional[str] = None,
+        list_id: Optional[int] = None,
+    ):
+        self.text = text
+        self.event_id = event_id
+        self.list_id = list_id
+        self._event = event
+        self._binary: bytes | None = None
+
+    @classmethod
+    def from_event(cls, event: Dict[str, Any]) -> "OutboundFrame":
+        return cls(json.dumps(event), event)
+
+    @property
+    def event(self) -> Dict[str, Any]:
+        if self._event is None:
+            self._event = json.loads(self.text)
+        return self._event
+
+    @property
+    def binary(self) -> bytes:
+        if self._binary is None:
+            self._binary = msgpack.packb(self.event)
+        return self._binary
+
+
+def decode_inbound(message: Dict[str, Any]) -> str:
+    """
+    Text of a client frame received with websocket.receive().
+    msgpack clients may send binary frames; they are turned into JSON text.
+    """
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", status.WS_1000_NORMAL_CLOSURE), message.get("reason"))
+    if message.get("bytes") is not None:
+        return json.dumps(msgpack.unpackb(message["bytes"]))
+    return message.get("text") or ""
+
+
+def coalesce_key(frame: OutboundFrame) -> Optional[Hashable]:
+    """Identity of the entity a frame describes, if later frames fully supersede it."""
+    # cheap textual check first, so most frames are never parsed
+    if '"task_updated"' not in frame.text:
+        return None
+    event = frame.event
+    if event.get("action") != "task_updated":
+        return None
+    task = event.get("task") or {}
+    return (event.get("list_id"), task.get("id"))
+
+
+class WebSocketConnection:
+    """
+    A client socket with a bounded outbound queue, subscribed to one or more list rooms.
+    - send() never blocks; frames are written by the connection's own writer task.
+    - When the queue is full the overflow policy decides what gives way.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        user_id: int,
+        max_queue: int = WS_SEND_QUEUE_SIZE,
+        overflow_policy: str = WS_OVERFLOW_POLICY,
+        protocol: str | None = None,
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown WebSocket overflow policy '{overflow_policy}'")
+
+        self.websocket = websocket
+        self.user_id = user_id
+        self.list_ids: Set[int] = set()
+        self.single_list = False  # opened for one list (/ws/{list_id}): closed when access to it ends
+        self.max_queue = max_queue
+        self.overflow_policy = overflow_policy
+        self.binary = protocol == PROTOCOL_MSGPACK
+        self.closed = False
+        self.dropped = 0
+
+        self._queue: Deque[OutboundFrame] = deque()
+        self._wakeup = asyncio.Event()
+        self._close_code: int | None = None
+        self._flush_on_close = False
+        self._writer: asyncio.Task | None = None
+        self._held: List[OutboundFrame] | None = None
+        self._held_dropped: Set[int] = set()  # lists that lost live frames while held
+
+        # liveness, maintained by the lifecycle manager
+        now = time.monotonic()
+        self.last_seen = now        # any inbound frame, pongs included
+        self.last_activity = now    # inbound frames other than pongs
+        self.ping_sent_at: float | None = None
+        self.handler: asyncio.Task | None = None  # the endpoint task reading this socket
+
+    def start(self):
+        """Start the writer task."""
+        if not self._writer:
+            self._writer = asyncio.create_task(self._write_loop())
+
+    def send(self, frame: OutboundFrame) -> bool:
+        """Queue a frame for delivery. Returns False if the connection is gone."""
+        if self.closed or self._close_code is not None:
+            return False
+
+        if self._held is not None:
+            if len(self._held) < self.max_queue:
+                self._held.append(frame)
+            else:
+                self.dropped += 1
+                self._held_dropped.add(frame.list_id)
+            return True
+
+        if len(self._queue) >= self.max_queue and not self._make_room(frame):
+            return False
+
+        self._queue.append(frame)
+        self._wakeup.set()
+        return True
+
+    def hold(self):
+        """Buffer live frames while a replay is fetched, so nothing overtakes it."""
+        self._held = []
+
+    def release(self, list_id: int, replayed: List[OutboundFrame]):
+        """
+        Queue replayed frames, then the held live frames that the replay did not cover.
+        Lists that lost frames because the hold buffer was full are told to resync.
+        """
+        held, self._held = self._held or [], None
+        dropped, self._held_dropped = self._held_dropped, set()
+        last_id = replayed[-1].event_id if replayed else None
+
+        for frame in replayed:
+            self.send(frame)
+        for frame in held:
+            if (
+                last_id and frame.event_id and frame.list_id == list_id
+                and stream_id_key(frame.event_id) <= stream_id_key(last_id)
+            ):
+                continue
+            self.send(frame)
+        for dropped_list_id in sorted({list_id if d is None else d for d in dropped}):
+            self.send(OutboundFrame.from_event({"action": "resync", "list_id": dropped_list_id}))
+
+    def _make_room(self, frame: OutboundFrame) -> bool:
+        """Apply the overflow policy to a full queue. Returns False if `frame` must not be queued."""
+        if self.overflow_policy == OVERFLOW_DISCONNECT:
+            logger.info(f"Evicting slow WebSocket consumer for user {self.user_id}")
+            self.evict(status.WS_1013_TRY_AGAIN_LATER)
+            return False
+
+        self.dropped += 1
+        if self.overflow_policy == OVERFLOW_COALESCE:
+            key = coalesce_key(frame)
+            if key is not None:
+                for queued in self._queue:
+                    if coalesce_key(queued) == key:
+                        self._queue.remove(queued)
+                        return True
+
+        self._queue.popleft()
+        return True
+
+    @property
+    def evicted(self) -> bool:
+        return self._close_code is not None
+
+    def evict(self, code: int, flush: bool = False):
+        """
+        Ask the writer to close the socket; the endpoint's receive loop then cleans up.
+        With `flush`, frames already queued are written before the close frame.
+        """
+        if self._close_code is None:
+            self._close_code = code
+            self._flush_on_close = flush
+            if not flush:
+                self._queue.clear()
+            self._wakeup.set()
+
+    async def _write_loop(self):
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+
+                while self._queue and (self._close_code is None or self._flush_on_close):
+                    frame = self._queue.popleft()
+                    if self.binary:
+                        await self.websocket.send_bytes(frame.binary)
+                    else:
+                        await self.websocket.send_text(frame.text)
+
+                if self._close_code is not None:
+                    await self.websocket.close(code=self._close_code)
+                    break
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"WebSocket write failed for user {self.user_id}: {e}")
+            try:
+                await self.websocket.close()
+            except Exception:
+                pass
+        finally:
+            self.closed = True
+
+    async def close(self):
+        """Stop the writer task and drop anything still queued."""
+        self.closed = True
+        self._queue.clear()
+        if self._writer:
+            self._writer.cancel()
+            try:
+                await self._writer
+            except (asyncio.CancelledError, Exception):
+                pass
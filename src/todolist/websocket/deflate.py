@@ -0,0 +1,56 @@
+from uvicorn.protocols.websockets.websockets_sansio_impl import WebSocketsSansIOProtocol
+from websockets.extensions.permessage_deflate import ServerPerMessageDeflateFactory
+from websockets.server import ServerProtocol
+
+from src.todolist.config import WS_DEFLATE_ENABLED, WS_DEFLATE_WINDOW_BITS, WS_DEFLATE_MEM_LEVEL
+
+from typing import Type, Union
+
+# what uvicorn 0.35's "websockets-sansio" protocol already offers
+UVICORN_WINDOW_BITS = 12
+UVICORN_MEM_LEVEL = 5
+
+
+def deflate_factory(
+    window_bits: int = WS_DEFLATE_WINDOW_BITS,
+    mem_level: int = WS_DEFLATE_MEM_LEVEL,
+) -> ServerPerMessageDeflateFactory:
+    """
+    permessage-deflate offer with a bounded window on both sides.
+    Task events are small and share most of their keys, so a 4KB window keeps
+    nearly all of the gain of the default 32KB at a fraction of the per-socket memory.
+    """
+    return ServerPerMessageDeflateFactory(
+        server_max_window_bits=window_bits,
+        client_max_window_bits=window_bits,
+        compress_settings={"memLevel": mem_level},
+    )
+
+
+class TunedDeflateWebSocketProtocol(WebSocketsSansIOProtocol):
+    """
+    uvicorn WebSocket protocol using the window sizes from config.
+    Pinned to uvicorn 0.35: it replaces the `conn` that WebSocketsSansIOProtocol builds
+    in __init__, so check it again on every uvicorn upgrade.
+    """
+
+    def __init__(self, config, server_state, app_state, _loop=None):
+        super().__init__(config, server_state, app_state, _loop)
+        extensions = [deflate_factory()] if WS_DEFLATE_ENABLED else []
+        self.conn = ServerProtocol(
+            extensions=extensions,
+            max_size=config.ws_max_size,
+            logger=self.conn.logger,
+        )
+
+
+def websocket_protocol() -> Union[str, Type[WebSocketsSansIOProtocol]]:
+    """
+    uvicorn `ws` setting: the stock sans-I/O protocol unless the deflate settings
+    differ from what it hardcodes, so the subclass is only in play when needed.
+    """
+    if not WS_DEFLATE_ENABLED or (
+        WS_DEFLATE_WINDOW_BITS == UVICORN_WINDOW_BITS and WS_DEFLATE_MEM_LEVEL == UVICORN_MEM_LEVEL
+    ):
+        return "websockets-sansio"
+    return TunedDeflateWebSocketProtocol
@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import random
+import time
+
+from fastapi import status
+
+from src.todolist.config import (
+    WS_HEARTBEAT_INTERVAL,
+    WS_PONG_TIMEOUT,
+    WS_IDLE_TIMEOUT,
+    WS_MAX_CONNECTIONS_PER_USER,
+    WS_MAX_CONNECTIONS_PER_NODE,
+    WS_DRAIN_SPREAD_MS,
+    WS_DRAIN_TIMEOUT
+)
+from src.todolist.metrics import WS_CONNECTIONS, WS_EVICTIONS, WS_REJECTED
+from src.todolist.websocket.connection import OutboundFrame, WebSocketConnection
+
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+PING_FRAME = OutboundFrame.from_event({"action": "ping"})
+DRAIN_POLL_INTERVAL = 0.1
+
+
+class ConnectionLifecycleManager:
+    """
+    Keeps the set of live sockets honest.
+    - Admission caps per user and per node.
+    - One sweeper task sends heartbeats and evicts idle or unresponsive peers.
+    - On shutdown, drain() moves clients off the node gradually instead of all at once.
+    """
+
+    def __init__(
+        self,
+        heartbeat_interval: int = WS_HEARTBEAT_INTERVAL,
+        pong_timeout: int = WS_PONG_TIMEOUT,
+        idle_timeout: int = WS_IDLE_TIMEOUT,
+        max_per_user: int = WS_MAX_CONNECTIONS_PER_USER,
+        max_per_node: int = WS_MAX_CONNECTIONS_PER_NODE,
+    ):
+        self.heartbeat_interval = heartbeat_interval
+        self.pong_timeout = pong_timeout
+        self.idle_timeout = idle_timeout
+        self.max_per_user = max_per_user
+        self.max_per_node = max_per_node
+
+        self.connections: Set[WebSocketConnection] = set()
+        self.per_user: Dict[int, int] = {}
+        self.reserved = 0
+        self.draining = False
+        self.sweep_hooks: List[Callable[[], Awaitable[None]]] = []  # run after every sweep
+        self._sweeper: asyncio.Task | None = None
+
+    def admit(self, user_id: int) -> Optional[int]:
+        """
+        Reserve a connection slot for `user_id`.
+        Returns a close code if a cap is reached, otherwise None; admitted
+        callers must call release() when the socket ends.
+        """
+        if self.draining:
+            WS_REJECTED.labels(reason="draining").inc()
+            return status.WS_1012_SERVICE_RESTART
+        if self.reserved >= self.max_per_node:
+            WS_REJECTED.labels(reason="node_cap").inc()
+            return status.WS_1013_TRY_AGAIN_LATER
+        if self.per_user.get(user_id, 0) >= self.max_per_user:
+            # not 1008: clients read that as a lost permission and stop reconnecting
+            WS_REJECTED.labels(reason="user_cap").inc()
+            return status.WS_1013_TRY_AGAIN_LATER
+
+        self.reserved += 1
+        self.per_user[user_id] = self.per_user.get(user_id, 0) + 1
+        return None
+
+    def register(self, connection: WebSocketConnection):
+        """Start tracking liveness for an admitted connection."""
+        connection.handler = asyncio.current_task()
+        self.connections.add(connection)
+        WS_CONNECTIONS.set(len(self.connections))
+
+        if not self._sweeper or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    def release(self, user_id: int, connection: WebSocketConnection | None = None):
+        """Give back the slot reserved by admit()."""
+        if connection is not None:
+            self.connections.discard(connection)
+            WS_CONNECTIONS.set(len(self.connections))
+
+        self.reserved = max(0, self.reserved - 1)
+        remaining = self.per_user.get(user_id, 0) - 1
+        if remaining > 0:
+            self.per_user[user_id] = remaining
+        else:
+            self.per_user.pop(user_id, None)
+
+    def touch(self, connection: WebSocketConnection, message: str):
+        """Record an inbound frame; pongs prove liveness but do not count as activity."""
+        now = time.monotonic()
+        connection.last_seen = now
+        if '"pong"' not in message:
+            connection.last_activity = now
+
+    def evict(self, connection: WebSocketConnection, reason: str, code: int, force: bool = False):
+        """
+        Close a connection from the server side.
+        `force` also cancels the endpoint task, for peers that will never
+        answer the close handshake.
+        """
+        logger.info(f"Evicting WebSocket for user {connection.user_id}: {reason}")
+        WS_EVICTIONS.labels(reason=reason).inc()
+        connection.evict(code)
+        self.connections.discard(connection)
+        if force and connection.handler and not connection.handler.done():
+            connection.handler.cancel()
+
+    def sweep(self):
+        """Evict dead and idle peers, then ping the rest."""
+        now = time.monotonic()
+        for connection in list(self.connections):
+            if connection.closed:
+                self.connections.discard(connection)
+                continue
+
+            ping_sent_at = connection.ping_sent_at
+            if ping_sent_at and connection.last_seen < ping_sent_at and now - ping_sent_at > self.pong_timeout:
+                self.evict(connection, "dead_peer", status.WS_1001_GOING_AWAY, force=True)
+                continue
+
+            if self.idle_timeout and now - connection.last_activity > self.idle_timeout:
+                self.evict(connection, "idle", status.WS_1001_GOING_AWAY)
+                continue
+
+            # only start a new ping round once the previous one was answered
+            if not ping_sent_at or connection.last_seen >= ping_sent_at:
+                connection.ping_sent_at = now
+                connection.send(PING_FRAME)
+
+        WS_CONNECTIONS.set(len(self.connections))
+
+    async def _wait_closed(self, connections: List[WebSocketConnection], timeout: float) -> List[WebSocketConnection]:
+        """Wait up to `timeout` seconds for connections to close; returns those still open."""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = [c for c in connections if not c.closed]
+            if not remaining or time.monotonic() >= deadline:
+                return remaining
+            await asyncio.sleep(DRAIN_POLL_INTERVAL)
+
+    async def drain(self, spread_ms: int = WS_DRAIN_SPREAD_MS, timeout: float = WS_DRAIN_TIMEOUT):
+        """
+        Empty the node before shutdown.
+        - New sockets are refused with 1012 (service restart).
+        - Every client gets a reconnect hint with its own random delay within `spread_ms`,
+          so the fleet reconnects elsewhere over that window instead of in one burst.
+        - Whoever is left after the spread is closed with 1012; anything still open at
+          `timeout` is cut off.
+        """
+        if self.draining:
+            return
+        self.draining = True
+
+        connections = [c for c in self.connections if not c.closed]
+        logger.info(f"Draining {len(connections)} WebSocket connections over {spread_ms}ms")
+        started = time.monotonic()
+        for connection in connections:
+            connection.send(OutboundFrame.from_event({
+                "action": "reconnect",
+                "after_ms": random.randint(0, spread_ms),
+            }))
+
+        remaining = await self._wait_closed(connections, min(spread_ms / 1000, timeout))
+        for connection in remaining:
+            WS_EVICTIONS.labels(reason="drain").inc()
+            connection.evict(status.WS_1012_SERVICE_RESTART, flush=True)
+
+        remaining = await self._wait_closed(remaining, timeout - (time.monotonic() - started))
+        for connection in remaining:
+            self.evict(connection, "drain_timeout", status.WS_1012_SERVICE_RESTART, force=True)
+        logger.info(f"WebSocket drain finished, {len(remaining)} connections cut off")
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"WebSocket sweep failed: {e}")
+            for hook in self.sweep_hooks:
+                try:
+                    await hook()
+                except Exception as e:
+                    logger.error(f"WebSocket sweep hook failed: {e}")
+
+
+ws_lifecycle = ConnectionLifecycleManager()
@@ -4,11 +4,28 @@ import logging
 
 import redis.asyncio as redis
 
-from fastapi import WebSocket
+from fastapi import WebSocket, status
 from typing import Callable, Dict, Set, List
 
+from src.todolist.config import (
+    EVENT_TRANSPORT,
+    WS_FANOUT,
+    WS_PRESENCE_ENABLED,
+    WS_SKIP_UNWATCHED,
+    WS_STREAM_REPLAY_LIMIT
+)
+from src.todolist.metrics import WS_EVICTIONS, WS_ROOM_CONNECTIONS
+from src.todolist.services.events.schema import CONTROL_ACTIONS, LIST_DELETED, MEMBER_REMOVED
+from src.todolist.services.local_bus import LocalPubSubManager
+from src.todolist.services.redis_batcher import RedisPublishBatcher
 from src.todolist.services.redis_manager import RedisPubSubManager
-from src.todolist.auth.models import TodolistUser
+from src.todolist.services.redis_streams import RedisStreamManager, with_event_id
+from src.todolist.websocket.coalescer import RoomCoalescer
+from src.todolist.websocket.connection import OutboundFrame, WebSocketConnection
+from src.todolist.websocket.models import WsPrincipal
+from src.todolist.websocket.presence import PresenceTracker
+from src.todolist.websocket.registry import RoomRegistry, room_nodes_key
+from src.todolist.websocket.revocations import AccessRevocations
 
 logging.basicConfig(
     level=logging.INFO,
@@ -16,59 +33,245 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# cheap pre-check before parsing a fanned-out message as an access-control event
+CONTROL_MARKERS = tuple(f'"{action}"' for action in CONTROL_ACTIONS)
+
+
 class WebSocketManager:
     """Manages WebSocket connections for ToDoList rooms (list_id)."""
 
     def __init__(self):
-        self.rooms: Dict[int, List[WebSocket]] = {}
+        self.rooms: Dict[int, Set[WebSocketConnection]] = {}
         self.redis_callbacks: Dict[int, Callable[[str], None]] = {}
-        self.pubsub = RedisPubSubManager()
+        self.coalescers: Dict[int, RoomCoalescer] = {}
+        # Streams keep a short per-list history so reconnecting clients can replay;
+        # the in-memory transport keeps fan-out inside this process, without Redis
+        if EVENT_TRANSPORT == "memory":
+            self.pubsub = LocalPubSubManager()
+        elif WS_FANOUT == "streams":
+            self.pubsub = RedisStreamManager()
+        else:
+            self.pubsub = RedisPubSubManager()
+        clustered = not isinstance(self.pubsub, LocalPubSubManager)
+        self.batcher = RedisPublishBatcher(self.pubsub)
+        self.presence = PresenceTracker(
+            self.pubsub, self.broadcast_task_event, enabled=WS_PRESENCE_ENABLED and clustered
+        )
+        self.registry = RoomRegistry(self.pubsub, enabled=clustered)
+        self.revocations = AccessRevocations(self.pubsub, enabled=clustered)
+        # Streams keep per-list history for replay, so only pubsub events can be dropped unseen;
+        # Redis drops them inside the publish pipeline, guarded by the room registry
+        self.skip_unwatched = WS_SKIP_UNWATCHED and clustered and WS_FANOUT == "pubsub"
+
+    def open(self, websocket: WebSocket, user_id: int, protocol: str | None = None) -> WebSocketConnection:
+        """Wrap an accepted socket and start its writer; it joins rooms separately."""
+        connection = WebSocketConnection(websocket, user_id, protocol=protocol)
+        connection.start()
+        return connection
 
-    async def connect_user(self, list_id: int, websocket: WebSocket, user: TodolistUser):
-        """Add user WebSocket to a ToDoList room."""
-        logger.info(f"WebSocket connected for list {list_id}, user {user.id}")
+    async def join(self, list_id: int, connection: WebSocketConnection, last_event_id: str | None = None):
+        """
+        Add a connection to a ToDoList room.
+        With streams fan-out, events after `last_event_id` are replayed first.
+        """
+        if list_id in connection.list_ids:
+            return
 
-        if list_id not in self.rooms:
-            self.rooms[list_id] = []
+        replay = last_event_id and isinstance(self.pubsub, RedisStreamManager)
+        if replay:
+            connection.hold()
+
+        # The room is created and joined before any await, so a concurrent leave
+        # never sees it empty while it is being set up
+        room = self.rooms.get(list_id)
+        new_room = room is None
+        if new_room:
+            room = self.rooms[list_id] = set()
+            self.coalescers[list_id] = RoomCoalescer(list_id, self._fan_out(list_id))
             cb = self._redis_callback(list_id)
             self.redis_callbacks[list_id] = cb
-            # Subscribe to Redis updates for this list
-            await self.pubsub.subscribe(f"todolist_{list_id}", cb)
-            logger.info(f"Subscribed Redis callbacks for list {list_id}")
+        room.add(connection)
+        connection.list_ids.add(list_id)
+        WS_ROOM_CONNECTIONS.labels(list_id=str(list_id)).set(len(room))
+
+        subscribed, counted = not new_room, False
+        try:
+            if new_room:
+                # Subscribe to Redis updates for this list
+                await self.pubsub.subscribe(f"todolist_{list_id}", cb)
+                subscribed = True
+                logger.info(f"Subscribed Redis callbacks for list {list_id}")
+                if self.rooms.get(list_id) is room:
+                    await self.registry.add(list_id)
+            await self.presence.join(list_id, connection.user_id)
+            counted = True
 
-        self.rooms[list_id].append(websocket)
+            if replay:
+                await self._replay(list_id, connection, last_event_id)
+        except Exception:
+            # Undo the join: a held connection would stall its other lists, and a room
+            # that never subscribed would keep its members waiting for events forever
+            if replay:
+                connection.release(list_id, [])
+            if not subscribed:
+                for other in room - {connection}:
+                    other.evict(status.WS_1011_INTERNAL_ERROR)
+            await self._leave(list_id, connection, counted)
+            raise
 
-    async def disconnect_user(self, list_id: int, websocket: WebSocket):
-        """Remove user from ToDoList room."""
-        self.rooms[list_id].remove(websocket)
-        logger.info(f"WebSocket disconnected for list {list_id}")
-        if not self.rooms[list_id]:
+    async def leave(self, list_id: int, connection: WebSocketConnection):
+        """Remove a connection from a ToDoList room, dropping the room when it empties."""
+        await self._leave(list_id, connection)
+
+    async def _leave(self, list_id: int, connection: WebSocketConnection, counted: bool = True):
+        connection.list_ids.discard(list_id)
+        room = self.rooms.get(list_id)
+        if room is None or connection not in room:
+            return
+
+        room.discard(connection)
+        WS_ROOM_CONNECTIONS.labels(list_id=str(list_id)).set(len(room))
+        emptied = not room
+        if emptied:
+            # Detach before any await: a join meanwhile starts a fresh room instead of
+            # entering this one after its subscription is gone
+            del self.rooms[list_id]
+            WS_ROOM_CONNECTIONS.remove(str(list_id))
+            coalescer = self.coalescers.pop(list_id, None)
+            if coalescer:
+                coalescer.flush()
             cb = self.redis_callbacks.pop(list_id, None)
+
+        if counted:
+            await self.presence.leave(list_id, connection.user_id)
+        if emptied:
+            if list_id not in self.rooms:
+                await self.registry.remove(list_id)
             if cb:
                 await self.pubsub.unsubscribe(f"todolist_{list_id}", cb)
                 logger.info(f"Unsubscribed Redis callbacks for list {list_id}")
-            del self.rooms[list_id]
+
+    async def connect_user(
+        self,
+        list_id: int,
+        websocket: WebSocket,
+        principal: WsPrincipal,
+        last_event_id: str | None = None,
+        protocol: str | None = None,
+    ) -> WebSocketConnection:
+        """Add user WebSocket to a single ToDoList room."""
+        logger.info(f"WebSocket connected for list {list_id}, user {principal.user_id}")
+
+        connection = self.open(websocket, principal.user_id, protocol)
+        connection.single_list = True
+        await self.join(list_id, connection, last_event_id)
+        return connection
+
+    async def _replay(self, list_id: int, connection: WebSocketConnection, last_event_id: str):
+        """Send a held connection what it missed, or tell it to reload if history is gone."""
+        entries = await self.pubsub.replay(f"todolist_{list_id}", last_event_id, WS_STREAM_REPLAY_LIMIT)
+        if entries is None:
+            logger.info(f"Replay unavailable for list {list_id} from {last_event_id}, requesting resync")
+            connection.release(list_id, [OutboundFrame.from_event({"action": "resync", "list_id": list_id})])
+            return
+
+        connection.release(list_id, [
+            OutboundFrame(with_event_id(data, entry_id), event_id=entry_id, list_id=list_id)
+            for entry_id, data in entries
+        ])
+        logger.info(f"Replayed {len(entries)} events for list {list_id}")
+
+    async def disconnect_user(self, connection: WebSocketConnection):
+        """Remove user from every ToDoList room it joined and stop its writer."""
+        await connection.close()
+        for list_id in list(connection.list_ids):
+            await self.leave(list_id, connection)
+        logger.info(f"WebSocket disconnected for user {connection.user_id}")
 
     async def broadcast_task_event(self, list_id: int, event: dict):
         """
         Publish a task event to Redis (all connected users will see it).
         Example event: {"action": "task_added", "task": {...}}
         """
+        # every frame names its list, so multiplexed sockets can tell rooms apart
+        event.setdefault("list_id", list_id)
         await self.pubsub.publish(f"todolist_{list_id}", json.dumps(event))
-        logger.info(f"Broadcasted event for list {list_id}: {event}")
+        logger.debug(f"Broadcasted event for list {list_id}")
+
+    def queue_task_event(self, list_id: int, event: dict, guard: str | None = None) -> asyncio.Future:
+        """
+        Like broadcast_task_event, but batched with other events into one Redis pipeline.
+        The returned future resolves once the event has reached Redis.
+        """
+        event.setdefault("list_id", list_id)
+        return self.batcher.submit(f"todolist_{list_id}", json.dumps(event), guard)
 
+    async def dispatch_task_event(self, list_id: int, event: dict, priority: bool = False) -> asyncio.Future:
+        """
+        queue_task_event; with skip_unwatched, Redis drops the event in the same pipeline when
+        no node has a room for the list, and the future resolves to NOT_PUBLISHED.
+        With `priority` the event is published right away instead of joining the pipeline batch.
+        """
+        if priority:
+            return asyncio.ensure_future(self.broadcast_task_event(list_id, event))
+        guard = room_nodes_key(list_id) if self.skip_unwatched else None
+        return self.queue_task_event(list_id, event, guard)
+
+    async def revoke(self, list_id: int, user_id: int | None = None):
+        """
+        Cut sockets off from a list: one user's (user_removed) or everyone's (list_deleted).
+        Single-list sockets are closed after writing what is queued, the revoking event included;
+        multiplexed sockets only leave the room.
+        """
+        for connection in list(self.rooms.get(list_id, ())):
+            if user_id is not None and connection.user_id != user_id:
+                continue
+            await self.leave(list_id, connection)
+            if connection.single_list:
+                WS_EVICTIONS.labels(reason="access_revoked").inc()
+                connection.evict(status.WS_1008_POLICY_VIOLATION, flush=True)
+        logger.info(f"Revoked access to list {list_id} for {'user ' + str(user_id) if user_id else 'everyone'}")
+
+    async def _apply_control(self, list_id: int, message: str):
+        """Act on access-control events locally once they have been fanned out."""
+        try:
+            event = json.loads(message)
+        except ValueError:
+            return
+        action = event.get("action")
+        if action == MEMBER_REMOVED:
+            user_id = (event.get("member") or {}).get("user_id")
+            if user_id is not None:
+                await self.revoke(list_id, user_id)
+        elif action == LIST_DELETED:
+            await self.revoke(list_id)
+
+    def _fan_out(self, list_id: int):
+        """Queue one frame on every connection in a ToDoList room."""
+
+        def deliver(frame: OutboundFrame):
+            # send() only enqueues, so a slow socket never holds up the room
+            for connection in list(self.rooms.get(list_id, ())):
+                connection.send(frame)
+
+        return deliver
 
     def _redis_callback(self, list_id: int):
-        """Callback to send Redis updates to all clients in a ToDoList room."""
-
-        async def callback(message: str):
-            data = json.loads(message)
-            if list_id in self.rooms:
-                for socket in list(self.rooms[list_id]):
-                    try:
-                        await socket.send_json(data)
-                    except Exception:
-                        self.rooms[list_id].remove(socket)
+        """Callback to pass Redis updates for a ToDoList room through its coalescer."""
+
+        async def callback(message: str, event_id: str | None = None):
+            # Forward the payload as published: one frame object, no per-socket re-encoding
+            if event_id:
+                message = with_event_id(message, event_id)
+            frame = OutboundFrame(message, event_id=event_id, list_id=list_id)
+            coalescer = self.coalescers.get(list_id)
+            if coalescer:
+                coalescer.add(frame)
+            if any(marker in message for marker in CONTROL_MARKERS):
+                # access changes skip the coalesce window, then take effect on this node's sockets
+                if coalescer:
+                    coalescer.flush()
+                await self._apply_control(list_id, message)
 
         return callback
 
@@ -0,0 +1,27 @@
+from typing import List, Optional
+
+from src.todolist.models import ToDoListBase
+
+
+class WsPrincipal(ToDoListBase):
+    """An authorized WebSocket subscriber for a single list."""
+
+    user_id: int
+    list_id: int
+    role: str
+    issued_at: Optional[float] = None  # capability tokens only
+
+
+class WsTokenResponse(ToDoListBase):
+    """Pydantic model for a per-list WebSocket capability token"""
+
+    token: str
+    expires_in: int
+
+
+class PresenceResponse(ToDoListBase):
+    """Pydantic model for the users currently viewing a list"""
+
+    list_id: int
+    count: int
+    user_ids: List[int]
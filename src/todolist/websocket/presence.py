@@ -0,0 +1,165 @@
+import logging
+import time
+
+from src.todolist.config import WS_PRESENCE_ENABLED, WS_PRESENCE_TTL
+from src.todolist.services.redis_manager import RedisPubSubManager
+
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1] = presence zset; ARGV = member, expires_at_ms, now_ms, key_ttl_ms
+# Returns 1 if the member was not present before (or had expired).
+PRESENCE_JOIN_LUA = """
+local previous = redis.call('ZSCORE', KEYS[1], ARGV[1])
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+redis.call('PEXPIRE', KEYS[1], ARGV[4])
+if previous and tonumber(previous) > tonumber(ARGV[3]) then
+    return 0
+end
+return 1
+"""
+
+# KEYS[1] = presence zset; ARGV = expires_at_ms, now_ms, key_ttl_ms, member...
+# Refreshes this node's members, then reaps everything that expired.
+# Returns {members that were (re)added, members reaped}.
+PRESENCE_SYNC_LUA = """
+local added = {}
+for i = 4, #ARGV do
+    local score = redis.call('ZSCORE', KEYS[1], ARGV[i])
+    if not score or tonumber(score) <= tonumber(ARGV[2]) then
+        added[#added + 1] = ARGV[i]
+    end
+    redis.call('ZADD', KEYS[1], ARGV[1], ARGV[i])
+end
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[2])
+if #expired > 0 then
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[2])
+end
+redis.call('PEXPIRE', KEYS[1], ARGV[3])
+return {added, expired}
+"""
+
+
+def presence_key(list_id: int) -> str:
+    return f"presence:{list_id}"
+
+
+class PresenceTracker:
+    """
+    Who is viewing each list, across every node.
+    - One sorted set per list: member = user id, score = expiry (ms).
+    - Nodes refcount their own sockets and only touch Redis on a user's first join / last leave.
+    - Heartbeats refresh all local viewers with one script call per list; joined/left
+      deltas are published only when membership actually changes.
+    """
+
+    def __init__(
+        self,
+        pubsub: RedisPubSubManager,
+        publish: Callable[[int, dict], Awaitable[None]],
+        ttl: int = WS_PRESENCE_TTL,
+        enabled: bool = WS_PRESENCE_ENABLED,
+    ):
+        self.pubsub = pubsub
+        self.publish = publish
+        self.ttl_ms = ttl * 1000
+        self.enabled = enabled
+        self.local: Dict[int, Dict[int, int]] = {}  # list_id -> user_id -> local sockets
+        self._join_script = None
+        self._sync_script = None
+
+    async def _redis(self):
+        redis = await self.pubsub._get_redis_connection()
+        if self._join_script is None:
+            self._join_script = redis.register_script(PRESENCE_JOIN_LUA)
+            self._sync_script = redis.register_script(PRESENCE_SYNC_LUA)
+        return redis
+
+    def _expiry(self) -> Tuple[int, int]:
+        now = int(time.time() * 1000)
+        return now, now + self.ttl_ms
+
+    async def _publish_delta(self, list_id: int, joined: List[int], left: List[int]):
+        if joined or left:
+            await self.publish(list_id, {"action": "presence", "joined": joined, "left": left})
+
+    async def join(self, list_id: int, user_id: int):
+        """Count a socket of `user_id` following `list_id`."""
+        users = self.local.setdefault(list_id, {})
+        users[user_id] = users.get(user_id, 0) + 1
+        if users[user_id] > 1 or not self.enabled:
+            return
+
+        try:
+            await self._redis()
+            now, expires_at = self._expiry()
+            added = await self._join_script(
+                keys=[presence_key(list_id)],
+                args=[user_id, expires_at, now, self.ttl_ms * 2],
+            )
+            if added:
+                await self._publish_delta(list_id, [user_id], [])
+        except Exception as e:
+            logger.error(f"Presence join failed for list {list_id}: {e}")
+
+    async def leave(self, list_id: int, user_id: int):
+        """Uncount a socket; the user leaves the list when their last local socket does."""
+        users = self.local.get(list_id)
+        if not users or user_id not in users:
+            return
+        users[user_id] -= 1
+        if users[user_id] > 0:
+            return
+        del users[user_id]
+        if not users:
+            del self.local[list_id]
+        if not self.enabled:
+            return
+
+        try:
+            redis = await self._redis()
+            if await redis.zrem(presence_key(list_id), user_id):
+                await self._publish_delta(list_id, [], [user_id])
+        except Exception as e:
+            logger.error(f"Presence leave failed for list {list_id}: {e}")
+
+    async def refresh(self):
+        """
+        Heartbeat: extend this node's viewers and reap expired ones (crashed nodes).
+        A user removed by another node's leave while still viewing here is re-announced.
+        """
+        if not self.enabled or not self.local:
+            return
+
+        redis = await self._redis()
+        now, expires_at = self._expiry()
+        list_ids = list(self.local)
+        async with redis.pipeline(transaction=False) as pipe:
+            for list_id in list_ids:
+                await self._sync_script(
+                    keys=[presence_key(list_id)],
+                    args=[expires_at, now, self.ttl_ms * 2, *self.local.get(list_id, {})],
+                    client=pipe,
+                )
+            results = await pipe.execute()
+
+        for list_id, (added, expired) in zip(list_ids, results):
+            await self._publish_delta(list_id, [int(u) for u in added], [int(u) for u in expired])
+
+    async def viewers(self, list_id: int, limit: int) -> Tuple[int, List[int]]:
+        """
+        Number of live viewers of a list and up to `limit` of their user ids.
+        Without Redis (disabled, or the in-memory transport) this node's own viewers.
+        """
+        if not self.enabled:
+            user_ids = sorted(self.local.get(list_id, {}))
+            return len(user_ids), user_ids[:limit]
+        redis = await self._redis()
+        now = int(time.time() * 1000)
+        key = presence_key(list_id)
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.zcount(key, now, "+inf")
+            pipe.zrangebyscore(key, now, "+inf", start=0, num=limit)
+            count, user_ids = await pipe.execute()
+        return count, [int(u) for u in user_ids]
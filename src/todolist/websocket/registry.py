@@ -0,0 +1,80 @@
+import logging
+import os
+import socket
+import time
+
+from src.todolist.config import WS_NODE_ID, WS_REGISTRY_TTL
+from src.todolist.services.redis_manager import RedisPubSubManager
+
+from typing import Set
+
+logger = logging.getLogger(__name__)
+
+NODE_ID = WS_NODE_ID or f"{socket.gethostname()}-{os.getpid()}"
+
+
+def room_nodes_key(list_id: int) -> str:
+    return f"ws_room_nodes:{list_id}"
+
+
+class RoomRegistry:
+    """
+    Cluster-wide record of which lists have live WebSocket rooms.
+    - One sorted set per list: member = node id, score = expiry (ms).
+    - A node adds itself when its room for a list opens and removes itself when it empties;
+      heartbeats keep the entries alive, so rooms of crashed nodes lapse on their own.
+    - Publishers pass room_nodes_key() as the guard of a pipelined publish, so Redis skips
+      events nobody would receive without an extra round-trip.
+    """
+
+    def __init__(
+        self,
+        pubsub: RedisPubSubManager,
+        node_id: str = NODE_ID,
+        ttl: int = WS_REGISTRY_TTL,
+        enabled: bool = True,
+    ):
+        self.pubsub = pubsub
+        self.enabled = enabled
+        self.node_id = node_id
+        self.ttl_ms = ttl * 1000
+        self.rooms: Set[int] = set()  # rooms open on this node
+
+    async def add(self, list_id: int):
+        """Register this node's room for `list_id`."""
+        self.rooms.add(list_id)
+        if not self.enabled:
+            return
+        try:
+            redis = await self.pubsub._get_redis_connection()
+            now = int(time.time() * 1000)
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.zadd(room_nodes_key(list_id), {self.node_id: now + self.ttl_ms})
+                pipe.pexpire(room_nodes_key(list_id), self.ttl_ms * 2)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Room registry add failed for list {list_id}: {e}")
+
+    async def remove(self, list_id: int):
+        """Unregister this node's room for `list_id` once it has emptied."""
+        self.rooms.discard(list_id)
+        if not self.enabled:
+            return
+        try:
+            redis = await self.pubsub._get_redis_connection()
+            await redis.zrem(room_nodes_key(list_id), self.node_id)
+        except Exception as e:
+            logger.error(f"Room registry remove failed for list {list_id}: {e}")
+
+    async def refresh(self):
+        """Heartbeat: extend every room this node holds, in one pipeline."""
+        if not self.enabled or not self.rooms:
+            return
+
+        redis = await self.pubsub._get_redis_connection()
+        expires_at = int(time.time() * 1000) + self.ttl_ms
+        async with redis.pipeline(transaction=False) as pipe:
+            for list_id in self.rooms:
+                pipe.zadd(room_nodes_key(list_id), {self.node_id: expires_at})
+                pipe.pexpire(room_nodes_key(list_id), self.ttl_ms * 2)
+            await pipe.execute()
@@ -0,0 +1,62 @@
+import logging
+import time
+
+from src.todolist.config import TODOLIST_WS_CAPABILITY_EXP
+from src.todolist.services.redis_manager import RedisPubSubManager
+
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def revoked_key(list_id: int, user_id: int | None = None) -> str:
+    return f"ws_revoked:{list_id}" if user_id is None else f"ws_revoked:{list_id}:{user_id}"
+
+
+class AccessRevocations:
+    """
+    Revocation epochs for WebSocket capability tokens, which are verified without the database.
+    - record() stamps a (list, user) pair, or a whole list, with the time access was taken away.
+    - A capability issued at or before that time is refused; one issued later (after the user
+      was added back) is not.
+    - Entries live as long as a capability does, in Redis when clustered, in-process otherwise.
+    """
+
+    def __init__(
+        self,
+        pubsub: RedisPubSubManager,
+        ttl: int = TODOLIST_WS_CAPABILITY_EXP,
+        enabled: bool = True,
+    ):
+        self.pubsub = pubsub
+        self.ttl = ttl
+        self.enabled = enabled
+        self.local: Dict[str, Tuple[float, float]] = {}  # key -> (revoked at, expires at)
+
+    async def record(self, list_id: int, user_id: int | None = None):
+        """Revoke capabilities for `list_id`: one user's, or everyone's when `user_id` is None."""
+        key = revoked_key(list_id, user_id)
+        now = time.time()
+        if not self.enabled:
+            self.local = {k: v for k, v in self.local.items() if v[1] > now}
+            self.local[key] = (now, now + self.ttl)
+            return
+        try:
+            redis = await self.pubsub._get_redis_connection()
+            await redis.set(key, repr(now), ex=self.ttl)
+        except Exception as e:
+            logger.error(f"Recording revocation failed for list {list_id}: {e}")
+
+    async def revoked_at(self, list_id: int, user_id: int) -> Optional[float]:
+        """
+        Latest revocation covering `user_id` on `list_id`, if any.
+        Raises if Redis cannot be asked, so callers can fall back to a membership lookup.
+        """
+        keys = [revoked_key(list_id), revoked_key(list_id, user_id)]
+        if not self.enabled:
+            now = time.time()
+            stamps = [self.local[k][0] for k in keys if k in self.local and self.local[k][1] > now]
+        else:
+            redis = await self.pubsub._get_redis_connection()
+            stamps = [float(v) for v in await redis.mget(keys) if v is not None]
+        return max(stamps) if stamps else None
@@ -1,31 +1,66 @@
 # src/todolist/websocket/utils.py
 import logging
+from datetime import datetime, timezone, timedelta
 from jose import jwt, JWTError
 from jose.exceptions import JWKError
 from fastapi import HTTPException, status
-from src.todolist.config import TODOLIST_JWT_SECRET, TODOLIST_JWT_ALG
+from src.todolist.auth.token_cache import decode_token
+from src.todolist.config import (
+    TODOLIST_JWT_ALG,
+    TODOLIST_JWT_SECRET,
+    TODOLIST_WS_CAPABILITY_EXP
+)
+from .models import WsPrincipal
 
 log = logging.getLogger(__name__)
 
+WS_CAPABILITY_SCOPE = "ws"
+
 def decode_jwt_token(token: str) -> dict:
     try:
-        algo_list = [TODOLIST_JWT_ALG] if isinstance(TODOLIST_JWT_ALG, str) else TODOLIST_JWT_ALG
-        
-        print(f"DEBUG: algo_list = {algo_list}")
-        
-        payload = jwt.decode(
-            token, 
-            TODOLIST_JWT_SECRET, 
-            algorithms=algo_list
-        )
-        
-        print(f"DEBUG: Token decoded successfully! User ID: {payload.get('sub')}")
-        return payload
-        
+        return decode_token(token)
+
     except (JWTError, JWKError) as e:
-        print(f"DEBUG: JWT Error: {type(e).__name__}: {str(e)}")
         log.error(f"WebSocket JWT Error: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail=f"Invalid or expired token: {str(e)}",
-        )
\ No newline at end of file
+        )
+
+
+def create_capability_token(*, user_id: int, list_id: int, role: str) -> str:
+    """Sign a short-lived token that lets `user_id` subscribe to `list_id` only."""
+    now = datetime.now(timezone.utc)
+    exp = now + timedelta(seconds=TODOLIST_WS_CAPABILITY_EXP)
+    data = {
+        "sub": str(user_id),
+        "list_id": list_id,
+        "role": role,
+        "scope": WS_CAPABILITY_SCOPE,
+        "iat": now.timestamp(),  # checked against revocation epochs
+        "exp": exp.timestamp(),
+    }
+    return jwt.encode(data, TODOLIST_JWT_SECRET, algorithm=TODOLIST_JWT_ALG)
+
+
+def verify_capability_token(token: str, list_id: int) -> WsPrincipal | None:
+    """
+    Authorize a WebSocket subscription from a capability token alone.
+    Returns None if the token is invalid, expired or issued for another list.
+    """
+    try:
+        payload = decode_token(token)
+    except (JWTError, JWKError) as e:
+        log.info(f"Rejected WebSocket capability: {e}")
+        return None
+
+    if payload.get("scope") != WS_CAPABILITY_SCOPE or payload.get("list_id") != list_id:
+        log.info(f"Capability scope mismatch for list {list_id}")
+        return None
+
+    return WsPrincipal(
+        user_id=int(payload["sub"]),
+        list_id=list_id,
+        role=payload.get("role", "viewer"),
+        issued_at=float(payload.get("iat", 0)),
+    )
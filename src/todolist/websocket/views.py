@@ -1,92 +1,265 @@
+import asyncio
+import json
+
 from fastapi import APIRouter, WebSocket, status
-from sqlalchemy.orm import Session
-from src.todolist.database.core import SessionLocal
+from starlette.concurrency import run_in_threadpool
+from src.todolist.database.core import get_session
 from src.todolist.websocket.manager import ws_manager
-from src.todolist.auth.service import get
-from src.todolist.auth.models import TodolistUser
-from .utils import decode_jwt_token
+from src.todolist.websocket.lifecycle import ws_lifecycle
+from src.todolist.tasks.models import TodolistMembers
+from src.todolist.config import WS_MAX_SUBSCRIPTIONS_PER_CONNECTION, WS_MSGPACK_ENABLED
+from .connection import (
+    PROTOCOL_JSON,
+    PROTOCOL_MSGPACK,
+    OutboundFrame,
+    WebSocketConnection,
+    decode_inbound
+)
+from .models import WsPrincipal
+from .utils import decode_jwt_token, verify_capability_token
 
 import logging
 log = logging.getLogger(__name__)
 
 ws_router = APIRouter()
 
-async def get_current_user_ws(websocket: WebSocket) -> TodolistUser | None:
-    """
-    Extracts token and authenticates user.
-    """
-    print(f"DEBUG: WebSocket connection attempt")
-    
-    # Get token from Query Param first
+# presence and the room registry are refreshed on the heartbeat rather than on their own timers
+ws_lifecycle.sweep_hooks.append(ws_manager.presence.refresh)
+ws_lifecycle.sweep_hooks.append(ws_manager.registry.refresh)
+
+
+def _session_user_id(token: str) -> int | None:
+    """User id from a login JWT (verified through the token cache, no DB)."""
+    try:
+        payload = decode_jwt_token(token)
+    except Exception as e:
+        log.info(f"WebSocket token rejected: {e}")
+        return None
+
+    user_id = payload.get("sub")
+    if not user_id or payload.get("scope"):
+        return None
+    return int(user_id)
+
+
+def _session_token(websocket: WebSocket) -> str | None:
+    """Login token from the `token` query param, falling back to the Authorization header."""
     token = websocket.query_params.get("token")
-    print(f"DEBUG: Token from query params: {token[:20] if token else 'None'}...")
-    
-    # Fallback to Header if query param fails
     if not token:
         auth_header = websocket.headers.get("Authorization")
-        print(f"DEBUG: Auth header: {auth_header}")
         if auth_header and auth_header.lower().startswith("bearer "):
             token = auth_header[7:]
-    
-    if not token:
-        print("DEBUG: No token found!")
+    return token
+
+
+def negotiate_protocol(websocket: WebSocket) -> str | None:
+    """
+    Pick a subprotocol from the client's Sec-WebSocket-Protocol offer.
+    msgpack wins when offered; clients that offer nothing get JSON text frames.
+    """
+    offered = websocket.scope.get("subprotocols") or []
+    if WS_MSGPACK_ENABLED and PROTOCOL_MSGPACK in offered:
+        return PROTOCOL_MSGPACK
+    if PROTOCOL_JSON in offered:
+        return PROTOCOL_JSON
+    return None
+
+
+def _membership_role(user_id: int, list_id: int) -> str | None:
+    """
+    Role of `user_id` in todolist_members, if any.
+    Blocking, so it must run in the threadpool.
+    """
+    with get_session() as session:
+        membership = (
+            session.query(TodolistMembers)
+            .filter_by(list_id=list_id, user_id=user_id)
+            .first()
+        )
+        return membership.role if membership else None
+
+
+async def authorize_capability(capability: str, list_id: int) -> WsPrincipal | None:
+    """
+    Verifies a capability token, then checks it was issued after any revocation
+    of the user's access (user_removed, list_deleted).
+    If Redis cannot be asked, membership is looked up instead.
+    """
+    principal = verify_capability_token(capability, list_id)
+    if not principal:
         return None
-    
-    session: Session = SessionLocal()
+
     try:
-        # Validate Token
-        print("DEBUG: Attempting to decode token...")
-        payload = decode_jwt_token(token)
-        user_id = payload.get("sub")
-        
-        if not user_id:
-            print("DEBUG: No user_id in payload!")
-            return None
-        
-        print(f"DEBUG: Getting user with ID: {user_id}")
-        user = get(db_session=session, user_id=int(user_id))
-        
-        if user:
-            print(f"DEBUG: User found: {user.email}")
-        else:
-            print(f"DEBUG: User not found in database!")
-        
-        return user
-        
+        revoked_at = await ws_manager.revocations.revoked_at(list_id, principal.user_id)
     except Exception as e:
-        print(f"DEBUG: Exception in get_current_user_ws: {type(e).__name__}: {str(e)}")
+        log.error(f"Revocation lookup failed for list {list_id}, checking membership: {e}")
+        role = await run_in_threadpool(_membership_role, principal.user_id, list_id)
+        return principal if role else None
+
+    if revoked_at is not None and principal.issued_at <= revoked_at:
+        log.info(f"Capability of user {principal.user_id} for list {list_id} was revoked")
         return None
-    finally:
-        session.close()
+    return principal
+
+
+async def authorize_list(user_id: int, list_id: int, capability: str | None = None) -> WsPrincipal | None:
+    """
+    Authorizes `user_id` to follow `list_id`.
+    A capability token is verified without touching the database;
+    otherwise membership is looked up off the event loop.
+    """
+    if capability:
+        principal = await authorize_capability(capability, list_id)
+        if principal and principal.user_id == user_id:
+            return principal
+        return None
+
+    role = await run_in_threadpool(_membership_role, user_id, list_id)
+    if not role:
+        log.info(f"User {user_id} is not a member of list {list_id}")
+        return None
+    return WsPrincipal(user_id=user_id, list_id=list_id, role=role)
+
+
+async def get_current_user_ws(websocket: WebSocket, list_id: int) -> WsPrincipal | None:
+    """
+    Authorizes a subscription to `list_id`.
+    A `cap` capability token is verified without touching the database;
+    a plain login token falls back to a membership lookup off the event loop.
+    """
+    capability = websocket.query_params.get("cap")
+    if capability:
+        return await authorize_capability(capability, list_id)
+
+    token = _session_token(websocket)
+    if not token:
+        log.debug(f"WebSocket for list {list_id} has no token")
+        return None
+
+    user_id = _session_user_id(token)
+    if not user_id:
+        return None
+    return await authorize_list(user_id, list_id)
 
 
 @ws_router.websocket("/ws/{list_id}")
 async def websocket_endpoint(websocket: WebSocket, list_id: int):
-    print(f"DEBUG: WebSocket endpoint called for list {list_id}")
-    
-    user = await get_current_user_ws(websocket)
+    principal = await get_current_user_ws(websocket, list_id)
     
-    if not user:
-        print(f"DEBUG: Authentication failed, closing connection with 1008")
+    if not principal:
+        log.debug(f"WebSocket authentication failed for list {list_id}, closing with 1008")
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION) 
         return
-    
-    print(f"DEBUG: User authenticated, accepting connection")
-    
-    await websocket.accept()
-    
-    print(f"DEBUG: Connection accepted, connecting to manager")
-    
-    # Connect to Manager
-    await ws_manager.connect_user(list_id, websocket, user)
-    
+
+    # Per-user and per-node caps; accept first so clients can tell a cap from bad auth
+    close_code = ws_lifecycle.admit(principal.user_id)
+    protocol = negotiate_protocol(websocket)
+    if close_code:
+        await websocket.accept(subprotocol=protocol)
+        await websocket.close(code=close_code)
+        return
+
+    connection = None
+    try:
+        # inside the try: a client dropping mid-handshake must not keep its slot
+        await websocket.accept(subprotocol=protocol)
+        # Clients resume from the last event id they saw (streams fan-out only)
+        last_event_id = websocket.query_params.get("last_event_id")
+        connection = await ws_manager.connect_user(list_id, websocket, principal, last_event_id, protocol)
+        ws_lifecycle.register(connection)
+
+        while True:
+            message = decode_inbound(await websocket.receive())
+            ws_lifecycle.touch(connection, message)
+    except asyncio.CancelledError:
+        # the lifecycle manager cancels this task to drop peers that stopped answering
+        if not (connection and connection.evicted):
+            raise
+        asyncio.current_task().uncancel()
+    except Exception as e:
+        log.info(f"WebSocket closed for list {list_id}: {type(e).__name__}")
+    finally:
+        ws_lifecycle.release(principal.user_id, connection)
+        if connection:
+            await ws_manager.disconnect_user(connection)
+
+
+def _control_reply(action: str, list_id: int | None, detail: str | None = None) -> OutboundFrame:
+    event = {"action": action, "list_id": list_id}
+    if detail:
+        event["detail"] = detail
+    return OutboundFrame.from_event(event)
+
+
+async def _handle_control_frame(connection: WebSocketConnection, message: str):
+    """
+    Apply a client frame on the multiplexed socket:
+    {"action": "subscribe", "list_id": 1, "cap": "...", "last_event_id": "..."}
+    {"action": "unsubscribe", "list_id": 1}
+    """
+    try:
+        frame = json.loads(message)
+        action = frame.get("action")
+        list_id = frame.get("list_id")
+    except (ValueError, AttributeError):
+        connection.send(_control_reply("error", None, "Malformed frame"))
+        return
+
+    if action not in ("subscribe", "unsubscribe"):
+        return
+    if not isinstance(list_id, int):
+        connection.send(_control_reply("error", None, "list_id must be an integer"))
+        return
+
+    if action == "unsubscribe":
+        await ws_manager.leave(list_id, connection)
+        connection.send(_control_reply("unsubscribed", list_id))
+        return
+
+    if list_id not in connection.list_ids:
+        if len(connection.list_ids) >= WS_MAX_SUBSCRIPTIONS_PER_CONNECTION:
+            connection.send(_control_reply("error", list_id, "Too many subscriptions"))
+            return
+        if not await authorize_list(connection.user_id, list_id, frame.get("cap")):
+            connection.send(_control_reply("error", list_id, "Not allowed to view this list"))
+            return
+
+    connection.send(_control_reply("subscribed", list_id))
+    await ws_manager.join(list_id, connection, frame.get("last_event_id"))
+
+
+@ws_router.websocket("/ws")
+async def multiplexed_websocket_endpoint(websocket: WebSocket):
+    """One authenticated socket that follows any number of lists via subscribe frames."""
+    token = _session_token(websocket)
+    user_id = _session_user_id(token) if token else None
+    if not user_id:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    close_code = ws_lifecycle.admit(user_id)
+    protocol = negotiate_protocol(websocket)
+    if close_code:
+        await websocket.accept(subprotocol=protocol)
+        await websocket.close(code=close_code)
+        return
+
+    connection = None
     try:
+        await websocket.accept(subprotocol=protocol)
+        connection = ws_manager.open(websocket, user_id, protocol)
+        ws_lifecycle.register(connection)
         while True:
-            # Keep the connection open
-            message = await websocket.receive_text()
-            print(f"DEBUG: Received message: {message}")
+            message = decode_inbound(await websocket.receive())
+            ws_lifecycle.touch(connection, message)
+            await _handle_control_frame(connection, message)
+    except asyncio.CancelledError:
+        if not (connection and connection.evicted):
+            raise
+        asyncio.current_task().uncancel()
     except Exception as e:
-        print(f"DEBUG: WebSocket exception: {type(e).__name__}: {str(e)}")
+        log.info(f"Multiplexed WebSocket closed for user {user_id}: {type(e).__name__}")
     finally:
-        print(f"DEBUG: Disconnecting user from manager")
-        await ws_manager.disconnect_user(list_id, websocket)
+        ws_lifecycle.release(user_id, connection)
+        if connection:
+            await ws_manager.disconnect_user(connection)
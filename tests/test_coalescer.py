@@ -0,0 +1,64 @@
+import asyncio
+import json
+
+from src.todolist.websocket.coalescer import RoomCoalescer
+from src.todolist.websocket.connection import OutboundFrame
+
+
+def _frame(action: str, task_id: int, title: str = "") -> OutboundFrame:
+    return OutboundFrame.from_event({"action": action, "list_id": 1, "task": {"id": task_id, "task_title": title}})
+
+
+def _collect(frames, window_ms: int = 1000):
+    delivered = []
+
+    async def run():
+        coalescer = RoomCoalescer(1, delivered.append, window_ms=window_ms)
+        for frame in frames:
+            coalescer.add(frame)
+        coalescer.flush()
+        return coalescer
+
+    return delivered, asyncio.run(run())
+
+
+def test_later_update_supersedes_earlier_one():
+    delivered, coalescer = _collect([
+        _frame("task_updated", 1, "a"),
+        _frame("task_updated", 2, "x"),
+        _frame("task_updated", 1, "b"),
+    ])
+    assert coalescer.superseded == 1
+    assert len(delivered) == 1
+    events = json.loads(delivered[0].text)["events"]
+    assert [(e["task"]["id"], e["task"]["task_title"]) for e in events] == [(2, "x"), (1, "b")]
+
+
+def test_other_actions_are_never_merged():
+    delivered, coalescer = _collect([_frame("task_added", 1), _frame("task_deleted", 1), _frame("task_added", 1)])
+    assert coalescer.superseded == 0
+    assert [e["action"] for e in json.loads(delivered[0].text)["events"]] == ["task_added", "task_deleted", "task_added"]
+
+
+def test_single_event_is_not_wrapped():
+    delivered, _ = _collect([_frame("task_updated", 1, "a")])
+    assert json.loads(delivered[0].text)["action"] == "task_updated"
+
+
+def test_zero_window_delivers_immediately():
+    delivered, coalescer = _collect([_frame("task_updated", 1, "a"), _frame("task_updated", 1, "b")], window_ms=0)
+    assert len(delivered) == 2
+    assert coalescer.superseded == 0
+
+
+def test_window_flushes_on_its_own():
+    delivered = []
+
+    async def run():
+        coalescer = RoomCoalescer(1, delivered.append, window_ms=10)
+        coalescer.add(_frame("task_updated", 1, "a"))
+        assert delivered == []
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+    assert len(delivered) == 1
@@ -0,0 +1,111 @@
+import asyncio
+
+from src.todolist.services.rabbitmq.executor import KeyedExecutor, OrderedAcker
+
+
+class FakeMessage:
+    def __init__(self, delivery_tag: int, calls: list):
+        self.delivery_tag = delivery_tag
+        self.calls = calls
+
+    async def ack(self, multiple: bool = False):
+        self.calls.append(("ack", self.delivery_tag, multiple))
+
+    async def nack(self, requeue: bool = True):
+        self.calls.append(("nack", self.delivery_tag, requeue))
+
+
+def _deliver(count: int, calls: list, acker: OrderedAcker):
+    messages = [FakeMessage(tag, calls) for tag in range(1, count + 1)]
+    for message in messages:
+        acker.track(message)
+    return messages
+
+
+def test_acks_only_the_finished_prefix():
+    calls = []
+
+    async def run():
+        acker = OrderedAcker()
+        m1, m2, m3 = _deliver(3, calls, acker)
+        await acker.done(m3)
+        await acker.done(m2)
+        assert calls == []
+        await acker.done(m1)
+        assert acker.pending == 0
+
+    asyncio.run(run())
+    assert calls == [("ack", 3, True)]
+
+
+def test_unmoved_failure_is_requeued_in_order():
+    calls = []
+
+    async def run():
+        acker = OrderedAcker()
+        m1, m2, m3 = _deliver(3, calls, acker)
+        await acker.done(m2, ok=False, error="boom")
+        await acker.done(m3)
+        await acker.done(m1)
+
+    asyncio.run(run())
+    assert calls == [("ack", 1, True), ("nack", 2, True), ("ack", 3, True)]
+
+
+def test_failure_moved_by_handler_is_acked():
+    calls, failures = [], []
+
+    async def on_failure(message, error):
+        failures.append((message.delivery_tag, error))
+        return True
+
+    async def run():
+        acker = OrderedAcker(on_failure=on_failure)
+        m1, m2 = _deliver(2, calls, acker)
+        await acker.done(m1, ok=False, error="boom")
+        await acker.done(m2)
+
+    asyncio.run(run())
+    assert failures == [(1, "boom")]
+    assert calls == [("ack", 1, True), ("ack", 2, True)]
+
+
+def test_keyed_executor_keeps_per_key_order():
+    seen = []
+
+    async def run():
+        executor = KeyedExecutor(lanes=4)
+        executor.start()
+        for i in range(20):
+            key = i % 3
+
+            async def job(key=key, i=i):
+                await asyncio.sleep(0.001 * (3 - key))
+                seen.append((key, i))
+
+            executor.submit(key, job)
+        await executor.join()
+        await executor.stop()
+
+    asyncio.run(run())
+    assert len(seen) == 20
+    for key in range(3):
+        assert [i for k, i in seen if k == key] == list(range(key, 20, 3))
+
+
+def test_late_results_from_a_reset_channel_are_ignored():
+    calls = []
+
+    async def run():
+        acker = OrderedAcker()
+        old, = _deliver(1, calls, acker)
+        acker.reset()
+        new1, new2 = _deliver(2, calls, acker)  # tags restart at 1 on the reopened channel
+        await acker.done(old)
+        await acker.done(new2)
+        assert calls == []
+        assert acker.pending == 2
+        await acker.done(new1)
+
+    asyncio.run(run())
+    assert calls == [("ack", 2, True)]
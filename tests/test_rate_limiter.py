@@ -0,0 +1,82 @@
+import asyncio
+
+import fakeredis.aioredis
+
+from src.todolist.services.rate_limiter import TOKEN_BUCKET_LUA, RateLimitRule, RedisRateLimiter
+
+
+def _limiter(**kwargs) -> RedisRateLimiter:
+    limiter = RedisRateLimiter(**kwargs)
+    limiter.redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    limiter._script = limiter.redis.register_script(TOKEN_BUCKET_LUA)
+    return limiter
+
+
+def _bucket(capacity, rate, now, debt=0, cost=1):
+    async def run():
+        redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        script = redis.register_script(TOKEN_BUCKET_LUA)
+        results = []
+        for t in now:
+            allowed, tokens = await script(keys=["rl:test"], args=[capacity, rate, t, debt, cost])
+            results.append((allowed, float(tokens)))
+        return results
+
+    return asyncio.run(run())
+
+
+def test_bucket_allows_burst_then_refuses():
+    results = _bucket(capacity=3, rate=0.001, now=[1000] * 4)
+    assert [allowed for allowed, _ in results] == [1, 1, 1, 0]
+    assert results[-1][1] == 0
+
+
+def test_bucket_refills_over_time():
+    results = _bucket(capacity=2, rate=0.001, now=[1000, 1000, 1000, 2000])
+    assert [allowed for allowed, _ in results] == [1, 1, 0, 1]
+
+
+def test_bucket_charges_debt_even_when_refusing():
+    allowed, tokens = _bucket(capacity=5, rate=0.001, now=[1000], debt=5)[0]
+    assert allowed == 0
+    assert tokens == 0
+
+
+def test_hit_refuses_over_capacity():
+    async def run():
+        limiter = _limiter(local_headroom=2)  # never admit locally
+        rule = RateLimitRule("write", per_minute=3)
+        return [(await limiter.hit(rule, "user:1")).allowed for _ in range(4)]
+
+    assert asyncio.run(run()) == [True, True, True, False]
+
+
+def test_local_admissions_are_charged_on_sync():
+    async def run():
+        limiter = _limiter(local_headroom=0, local_sync_ms=60000)
+        rule = RateLimitRule("write", per_minute=10)
+        await limiter.hit(rule, "user:1")  # synced: 9 left
+        for _ in range(4):
+            assert (await limiter.hit(rule, "user:1")).allowed
+        assert limiter._local["rl:write:user:1"].debt == 4
+        limiter._local["rl:write:user:1"].synced_at = 0  # force the next hit to sync
+        result = await limiter.hit(rule, "user:1")
+        return result, limiter._local["rl:write:user:1"].debt
+
+    result, debt = asyncio.run(run())
+    assert result.allowed
+    assert 3.9 < result.remaining < 4.1
+    assert debt == 0
+
+
+def test_remember_keeps_debt_admitted_during_a_sync():
+    limiter = RedisRateLimiter()
+    limiter._remember("rl:write:user:1", 50, 1000)
+    limiter._local["rl:write:user:1"].debt = 4
+    limiter._remember("rl:write:user:1", 40, 2000)
+    assert limiter._local["rl:write:user:1"].tokens == 40
+    assert limiter._local["rl:write:user:1"].debt == 4
+
+    # an older sync finishing last does not overwrite the newer state
+    limiter._remember("rl:write:user:1", 99, 1500)
+    assert limiter._local["rl:write:user:1"].tokens == 40
@@ -0,0 +1,67 @@
+import json
+from datetime import date, datetime
+
+import msgpack
+import pytest
+
+from src.todolist.services.events.schema import (
+    CONTENT_TYPE_JSON,
+    CONTENT_TYPE_MSGPACK,
+    SCHEMA_VERSION,
+    TASK_DELETED,
+    TASK_FIELDS,
+    TASK_UPDATED,
+    UnsupportedEventVersion,
+    decode_event,
+    encode_event,
+    make_event,
+)
+
+TASK = {
+    "id": 7, "list_id": 3, "task_title": "milk", "task_details": None, "due_date": date(2026, 1, 2),
+    "start_time": None, "is_completed": False, "is_starred": True,
+    "created_at": datetime(2026, 1, 1, 12, 0), "updated_at": None, "owner_secret": "x",
+}
+
+
+def test_make_event_keeps_only_declared_fields():
+    event = make_event(TASK_UPDATED, TASK)
+    assert set(event["task"]) == set(TASK_FIELDS)
+    assert event["task"]["due_date"] == "2026-01-02"
+    assert make_event(TASK_DELETED, TASK) == {"action": TASK_DELETED, "task": {"id": 7}}
+
+
+@pytest.mark.parametrize("encoding,content_type", [("msgpack", CONTENT_TYPE_MSGPACK), ("json", CONTENT_TYPE_JSON)])
+def test_roundtrip(encoding, content_type):
+    event = make_event(TASK_UPDATED, TASK)
+    body, ctype = encode_event(event, encoding)
+    assert ctype == content_type
+    assert decode_event(body, ctype) == event
+
+
+def test_none_fields_are_left_off_the_wire():
+    body, _ = encode_event(make_event(TASK_UPDATED, TASK), "msgpack")
+    wire = msgpack.unpackb(body, raw=False)
+    assert wire["v"] == SCHEMA_VERSION
+    assert "task_details" not in wire["task"]
+
+
+def test_unversioned_json_is_accepted():
+    body = json.dumps({"action": TASK_DELETED, "task": {"id": 1}}).encode()
+    assert decode_event(body) == {"action": TASK_DELETED, "task": {"id": 1}}
+
+
+def test_newer_version_is_refused():
+    body = msgpack.packb({"v": SCHEMA_VERSION + 1, "action": TASK_DELETED, "task": {"id": 1}})
+    with pytest.raises(UnsupportedEventVersion):
+        decode_event(body, CONTENT_TYPE_MSGPACK)
+
+
+def test_unknown_fields_pass_through():
+    body = json.dumps({"v": SCHEMA_VERSION, "action": TASK_DELETED, "task": {"id": 1}, "extra": 1}).encode()
+    assert decode_event(body, CONTENT_TYPE_JSON)["extra"] == 1
+
+
+def test_non_map_is_rejected():
+    with pytest.raises(ValueError):
+        decode_event(b"[1, 2]", CONTENT_TYPE_JSON)
@@ -0,0 +1,38 @@
+import pytest
+
+from src.todolist.services.rabbitmq.shards import parse_shards, shard_for_list
+
+
+def test_shard_is_stable_and_in_range():
+    for list_id in range(1000):
+        shard = shard_for_list(list_id, 8)
+        assert 0 <= shard < 8
+        assert shard_for_list(list_id, 8) == shard
+
+
+def test_single_shard_takes_everything():
+    assert {shard_for_list(list_id, 1) for list_id in range(100)} == {0}
+
+
+def test_growing_moves_few_lists_and_only_to_new_shards():
+    before = {list_id: shard_for_list(list_id, 8) for list_id in range(10000)}
+    after = {list_id: shard_for_list(list_id, 10) for list_id in range(10000)}
+    moved = [list_id for list_id in before if before[list_id] != after[list_id]]
+    # Expect about 2/10 of the lists to move, all of them onto shard 8 or 9.
+    assert 0.15 < len(moved) / len(before) < 0.25
+    assert {after[list_id] for list_id in moved} <= {8, 9}
+
+
+def test_parse_shards():
+    assert parse_shards("", 4) == [0, 1, 2, 3]
+    assert parse_shards("  ", 2) == [0, 1]
+    assert parse_shards("0,2", 4) == [0, 2]
+    assert parse_shards("1-3", 4) == [1, 2, 3]
+    assert parse_shards("3, 0-1,1", 4) == [0, 1, 3]
+
+
+def test_parse_shards_out_of_range():
+    with pytest.raises(ValueError):
+        parse_shards("4", 4)
+    with pytest.raises(ValueError):
+        parse_shards("2-5", 4)
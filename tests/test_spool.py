@@ -0,0 +1,128 @@
+import os
+
+import pytest
+
+from src.todolist.services.rabbitmq.spool import HEADER, SegmentSpool
+
+
+def _record(i: int, size: int = 10):
+    return (f"shard.{i % 4}", "application/msgpack", 1000 + i, bytes([i % 256]) * size)
+
+
+def _spool(directory, segment_bytes=200, max_bytes=10_000) -> SegmentSpool:
+    spool = SegmentSpool(str(directory), segment_bytes=segment_bytes, max_bytes=max_bytes, fsync=False)
+    spool.open()
+    return spool
+
+
+def _drain(spool: SegmentSpool, limit: int = 3):
+    out = []
+    while not spool.empty:
+        records, offset = spool.read(limit)
+        out.extend(records)
+        spool.commit(offset)
+    return out
+
+
+def _segment_files(spool: SegmentSpool):
+    return sorted(name for name in os.listdir(spool.directory) if name.endswith(".seg"))
+
+
+def test_rotates_and_replays_in_order(tmp_path):
+    spool = _spool(tmp_path)
+    records = [_record(i) for i in range(30)]
+    for record in records:
+        assert spool.append(record)
+    assert len(_segment_files(spool)) > 1
+    assert _drain(spool) == records
+    assert spool.size == 0
+    assert _segment_files(spool) == []
+
+
+def test_refuses_records_past_max_bytes(tmp_path):
+    spool = _spool(tmp_path, max_bytes=150)
+    accepted = 0
+    while spool.append(_record(accepted)):
+        accepted += 1
+    assert 0 < accepted < 10
+    assert spool.size <= 150
+    spool.commit(spool.read(100)[1])
+    assert spool.append(_record(0))
+
+
+def test_commit_keeps_unconfirmed_records(tmp_path):
+    spool = _spool(tmp_path, segment_bytes=10_000)
+    records = [_record(i) for i in range(5)]
+    for record in records:
+        spool.append(record)
+    first, offset = spool.read(2)
+    assert first == records[:2]
+    spool.commit(offset)
+    assert not spool.empty
+    assert spool.read(10)[0] == records[2:]
+
+
+def test_appends_after_catching_up_start_a_new_segment(tmp_path):
+    spool = _spool(tmp_path)
+    spool.append(_record(0))
+    spool.commit(spool.read(10)[1])
+    assert spool.empty
+    spool.append(_record(1))
+    assert len(_segment_files(spool)) == 1
+    assert _drain(spool) == [_record(1)]
+
+
+def test_reopen_finds_backlog(tmp_path):
+    spool = _spool(tmp_path)
+    records = [_record(i) for i in range(20)]
+    for record in records:
+        spool.append(record)
+    size = spool.size
+    spool.close()
+
+    reopened = _spool(tmp_path)
+    assert reopened.size == size
+    assert _drain(reopened) == records
+
+
+@pytest.mark.parametrize("cut", [3, HEADER.size + 2])  # a short header, a short payload
+def test_torn_record_ends_the_segment(tmp_path, cut):
+    spool = _spool(tmp_path, segment_bytes=10_000)
+    for i in range(3):
+        spool.append(_record(i))
+    path = os.path.join(spool.directory, _segment_files(spool)[0])
+    spool.close()
+
+    record_size = os.path.getsize(path) // 3
+    with open(path, "r+b") as segment:
+        segment.truncate(2 * record_size + cut)
+
+    reopened = _spool(tmp_path, segment_bytes=10_000)
+    records, offset = reopened.read(10)
+    assert records == [_record(0), _record(1)]
+    reopened.commit(offset)
+    assert reopened.empty
+
+
+def test_corrupt_record_ends_the_segment(tmp_path):
+    spool = _spool(tmp_path, segment_bytes=10_000)
+    for i in range(3):
+        spool.append(_record(i))
+    path = os.path.join(spool.directory, _segment_files(spool)[0])
+    spool.close()
+
+    with open(path, "r+b") as segment:
+        segment.seek(os.path.getsize(path) - 1)
+        segment.write(b"\xff")
+
+    reopened = _spool(tmp_path, segment_bytes=10_000)
+    assert reopened.read(10)[0] == [_record(0), _record(1)]
+
+
+def test_processes_claim_separate_slots(tmp_path):
+    first = _spool(tmp_path)
+    second = _spool(tmp_path)
+    assert first.directory != second.directory
+    first.close()
+    third = _spool(tmp_path)
+    assert third.directory == os.path.join(str(tmp_path), "slot-0")